@@ -0,0 +1,74 @@
+"""
+Benchmark de tiempo de importación del camino sin interfaz gráfica.
+
+Importa cada módulo en un intérprete limpio (`python -X importtime`), mide el tiempo
+acumulado y la memoria residente, y comprueba que ninguna dependencia de visualización
+(ni googlemaps) se carga al importar el solver o el pipeline headless. Sale con código 1
+si se rompe alguna de las dos condiciones.
+
+Uso:
+    python -m benchmarks.bench_import_time
+    python -m benchmarks.bench_import_time --budget-ms 1500
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+HEADLESS_MODULES = ("src.engine.solver", "src.utils.data_manager", "src.pipeline")
+FORBIDDEN = ("folium", "plotly", "pandas", "networkx", "matplotlib", "polyline", "googlemaps")
+
+PROBE = """
+import json, sys, time, resource
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "loaded": sorted(m for m in {forbidden!r} if m in sys.modules),
+}}))
+"""
+
+
+def measure(module):
+    """Tiempo, memoria y dependencias pesadas cargadas al importar `module` en frío."""
+    probe = PROBE.format(module=module, forbidden=FORBIDDEN)
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], cwd=PROJECT_ROOT,
+                         capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    # Los 5 módulos más caros según -X importtime (tiempo acumulado, µs)
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if line.startswith("import time:") and len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].strip()))
+    result["top"] = [f"{name} {us / 1000:.0f}ms" for us, name in sorted(rows, reverse=True)[1:6]]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=list(HEADLESS_MODULES))
+    parser.add_argument("--budget-ms", type=float, default=2000, help="tiempo máximo de importación por módulo")
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules:
+        r = measure(module)
+        print(f"{module:<28} {r['seconds'] * 1000:7.0f} ms  {r['rss_mb']:6.1f} MB  | {', '.join(r['top'])}")
+        if r["loaded"]:
+            failures.append(f"{module} carga {', '.join(r['loaded'])}")
+        if r["seconds"] * 1000 > args.budget_ms:
+            failures.append(f"{module} tarda {r['seconds'] * 1000:.0f} ms (> {args.budget_ms:.0f} ms)")
+
+    if failures:
+        print("\n❌ " + "\n❌ ".join(failures))
+        raise SystemExit(1)
+    print("\n✅ Importación headless sin dependencias de visualización.")
+
+
+if __name__ == "__main__":
+    main()
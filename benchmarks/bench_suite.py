@@ -0,0 +1,232 @@
+"""
+Suite de benchmarks reproducible con instancias sintéticas ibéricas.
+
+Cada instancia se genera con semilla fija remuestreando los puntos reales de
+`cliente_ubi.json` (con un pequeño ruido gaussiano) y usando las plantas reales de
+Smurfit. Para cada tamaño se cronometran las etapas del pipeline:
+
+    selection   DataManager.get_optimized_locations (índice de pasillo incluido)
+    matrix      GeoUtils.calculate_distance_matrix (Haversine sin API key; con
+                GOOGLE_MAPS_BASE_URL apuntando a fake_gmaps_server.py mide el camino real)
+    solve       LogisticsSolver.solve con un presupuesto fijo de tiempo
+    visualizer  Visualizer.create_map + create_plotly_graph
+
+y la calidad frente al tiempo (objetivo de la primera solución y a fracciones del
+presupuesto). Los resultados se comparan con `benchmarks/baseline.json`.
+
+Uso:
+    python -m benchmarks.bench_suite                          # 50/200/1000/5000 nodos
+    python -m benchmarks.bench_suite --sizes 50 200 --seconds 5
+    python -m benchmarks.bench_suite --update-baseline
+"""
+import argparse
+import json
+import math
+import platform
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+import polars as pl
+from src.config import DATA_DIR, CACHE_DIR
+from src.engine.search_budget import SearchBudget
+from src.engine.solver import LogisticsSolver
+from src.utils.client_store import load_client_store
+from src.utils.data_manager import DataManager
+from src.utils.visualizer import Visualizer
+
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+INSTANCES_DIR = CACHE_DIR / "benchmarks"
+DEFAULT_SIZES = (50, 200, 1000, 5000)
+JITTER_KM = 5.0               # Desviación del ruido sobre los puntos reales
+SELECTION_THRESHOLD_KM = 2000 # Sin filtro efectivo: el tamaño lo fija max_customers_per_plant
+TRACE_FRACTIONS = (0.1, 0.25, 0.5, 1.0)
+
+
+def load_plants():
+    with open(DATA_DIR / "locations_smurfit.json", 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def synthetic_clients(n_clients, seed, source=DATA_DIR / "cliente_ubi.json"):
+    """
+    Remuestrea `n_clients` puntos de la distribución real de clientes con ruido
+    gaussiano de JITTER_KM. Devuelve la tabla en el formato plano del notebook.
+    """
+    real = load_client_store(source)
+    rng = np.random.default_rng(seed)
+    pick = rng.integers(0, real.height, n_clients)
+    lats = real["lat"].to_numpy()[pick]
+    lngs = real["lng"].to_numpy()[pick]
+    sigma_lat = JITTER_KM / 111.0
+    sigma_lng = sigma_lat / np.cos(np.radians(lats))
+    return pl.DataFrame({
+        "codigo_postal": [f"S{seed}{i:06d}" for i in range(n_clients)],
+        "municipio_destino": [f"Sintético {i}" for i in range(n_clients)],
+        "pais_destino": real["country"].to_numpy()[pick],
+        "latitude": np.round(lats + rng.normal(0, 1, n_clients) * sigma_lat, 5),
+        "longitude": np.round(lngs + rng.normal(0, 1, n_clients) * sigma_lng, 5),
+    })
+
+
+def instance_file(n_nodes, seed):
+    """Fuente sintética en disco (se reutiliza entre ejecuciones con la misma semilla)."""
+    INSTANCES_DIR.mkdir(parents=True, exist_ok=True)
+    path = INSTANCES_DIR / f"synthetic_{n_nodes}_s{seed}.parquet"
+    if not path.exists():
+        # Reserva holgada de clientes para que la selección tenga dónde elegir
+        synthetic_clients(max(4 * n_nodes, 2000), seed).write_parquet(path)
+    return path
+
+
+def quality_profile(trace, seconds):
+    """Mejor objetivo alcanzado en cada fracción del presupuesto (None si aún no había solución)."""
+    profile = {}
+    for fraction in TRACE_FRACTIONS:
+        reached = [obj for t, obj in trace if t <= fraction * seconds]
+        profile[f"{fraction:g}"] = min(reached) if reached else None
+    return profile
+
+
+def run_instance(plants, n_nodes, seed, seconds, out_dir):
+    n_plants = len(plants['carton_plants'])
+    per_plant = max(1, math.ceil((n_nodes - 1 - n_plants) / n_plants))
+    dm = DataManager(plants['paper_plant'], plants['carton_plants'], instance_file(n_nodes, seed))
+    dm.load_clients()
+    stages = {}
+
+    start = time.perf_counter()
+    data = dm.get_optimized_locations(per_plant, SELECTION_THRESHOLD_KM)
+    stages["selection"] = time.perf_counter() - start
+
+    # El constructor del solver es quien llama a GeoUtils.calculate_distance_matrix
+    start = time.perf_counter()
+    solver = LogisticsSolver(data)
+    stages["matrix"] = time.perf_counter() - start
+    matrix, is_road = solver.distance_matrix, solver.is_real_road
+
+    start = time.perf_counter()
+    routes = solver.solve(budget=SearchBudget(time_limit_s=seconds), seed=seed)
+    stages["solve"] = time.perf_counter() - start
+    run = solver.last_run or {}
+
+    start = time.perf_counter()
+    if routes:
+        visualizer = Visualizer(routes, matrix, kpis=solver.kpis)
+        visualizer.create_map(out_dir / f"bench_{n_nodes}_map.html")
+        visualizer.create_plotly_graph(out_dir / f"bench_{n_nodes}_graph.html")
+    stages["visualizer"] = time.perf_counter() - start
+
+    trace = run.get("objective_trace", [])
+    return {
+        "nodes": len(solver.nodes),
+        "seed": seed,
+        "budget_s": seconds,
+        "sparse_k": solver.sparse_k,
+        "road_distances": bool(is_road),
+        "stages_s": {k: round(v, 4) for k, v in stages.items()},
+        "objective": run.get("objective"),
+        "routes": len(routes or []),
+        # Los clientes sin servir cuestan la penalización de la disyunción cada uno
+        "customers_unserved": len(solver.customer_indices) - solver.kpis.summary()["customers_served"],
+        "solutions": run.get("solutions"),
+        "first_solution": {"t": trace[0][0], "objective": trace[0][1]} if trace else None,
+        "quality": quality_profile(trace, seconds),
+        "stop_reason": run.get("stop_reason"),
+    }
+
+
+def compare(results, baseline, time_tolerance, objective_tolerance):
+    """Compara con la línea base; devuelve la lista de regresiones detectadas."""
+    regressions = []
+    base_by_size = {str(r["size"]): r for r in baseline.get("results", [])}
+    for r in results:
+        base = base_by_size.get(str(r["size"]))
+        if base is None:
+            print(f"  {r['size']:>5}: sin línea base")
+            continue
+        parts = []
+        for stage, t in r["stages_s"].items():
+            t0 = base["stages_s"].get(stage)
+            if not t0:
+                continue
+            ratio = t / t0
+            parts.append(f"{stage} x{ratio:.2f}")
+            # Las etapas de milisegundos son ruido: solo cuentan por encima de 50 ms
+            if ratio > 1 + time_tolerance and t > 0.05:
+                regressions.append(f"{r['size']} nodos: {stage} {t0:.3f}s -> {t:.3f}s")
+        if r["objective"] is not None and base.get("objective"):
+            delta = r["objective"] / base["objective"] - 1
+            parts.append(f"objetivo {delta:+.2%}")
+            if delta > objective_tolerance:
+                regressions.append(f"{r['size']} nodos: objetivo {base['objective']} -> {r['objective']}")
+        elif base.get("objective") and r["objective"] is None:
+            regressions.append(f"{r['size']} nodos: sin solución (la línea base sí la tenía)")
+        print(f"  {r['size']:>5}: " + " | ".join(parts))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--seconds", type=float, default=10, help="presupuesto fijo de búsqueda por instancia")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="regresión si una etapa tarda un 25%% más")
+    parser.add_argument("--objective-tolerance", type=float, default=0.01, help="regresión si el objetivo empeora un 1%%")
+    parser.add_argument("--output", type=Path, help="guardar los resultados en JSON")
+    args = parser.parse_args()
+
+    plants = load_plants()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            print(f"\n📏 Instancia de {size} nodos (semilla {args.seed}, {args.seconds:g}s)")
+            result = {"size": size, **run_instance(plants, size, args.seed, args.seconds, Path(tmp))}
+            results.append(result)
+            print(json.dumps({k: result[k] for k in ("nodes", "stages_s", "objective", "first_solution")}))
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seconds": args.seconds,
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    failed = [r["size"] for r in results if not r["routes"]]
+    for r in results:
+        if r["routes"] and r["customers_unserved"]:
+            print(f"⚠️ {r['size']} nodos: {r['customers_unserved']} clientes sin servir "
+                  f"(penalización incluida en el objetivo)")
+    if failed:
+        # Una instancia sin solución no sirve como referencia ni puede pasar la comparación
+        print(f"\n❌ Sin solución en las instancias de {failed} nodos: la línea base no se actualiza.")
+        raise SystemExit(1)
+
+    if args.update_baseline or not args.baseline.exists():
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Línea base guardada en {args.baseline}")
+        return
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get("seconds") != args.seconds or baseline.get("seed") != args.seed:
+        print("\n⚠️ La línea base se midió con otro presupuesto/semilla: la comparación es orientativa.")
+    print("\n📊 Comparación con la línea base:")
+    regressions = compare(results, baseline, args.time_tolerance, args.objective_tolerance)
+    if regressions:
+        print("\n❌ Regresiones:")
+        for line in regressions:
+            print(f"  - {line}")
+        raise SystemExit(1)
+    print("\n✅ Sin regresiones respecto a la línea base.")
+
+
+if __name__ == "__main__":
+    main()
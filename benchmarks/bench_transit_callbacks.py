@@ -0,0 +1,65 @@
+"""
+Benchmark: callbacks de tránsito en Python vs. matriz/vector registrados de forma nativa.
+
+Resuelve la misma instancia con el mismo presupuesto de tiempo en ambos modos y compara
+ramas exploradas por segundo (iteraciones de búsqueda) y soluciones encontradas.
+
+Uso:
+    python -m benchmarks.bench_transit_callbacks --customers 6 --seconds 10
+"""
+import argparse
+import json
+import time
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+from src.config import DATA_DIR
+from src.engine.solver import LogisticsSolver
+from src.utils.data_manager import DataManager
+
+
+def run(solver, native, seconds):
+    manager, routing = solver._build_model(native_transits=native)
+    solutions = []
+    routing.AddAtSolutionCallback(lambda: solutions.append(routing.CostVar().Max()))
+
+    params = pywrapcp.DefaultRoutingSearchParameters()
+    params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION
+    params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    params.time_limit.seconds = seconds
+
+    start = time.perf_counter()
+    assignment = routing.SolveWithParameters(params)
+    elapsed = time.perf_counter() - start
+    branches = routing.solver().Branches()
+    return {
+        "mode": "native" if native else "python_callbacks",
+        "seconds": round(elapsed, 3),
+        "branches": branches,
+        "branches_per_s": round(branches / elapsed, 1),
+        "solutions": len(solutions),
+        "solutions_per_s": round(len(solutions) / elapsed, 2),
+        "objective": assignment.ObjectiveValue() if assignment else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=6, help="max_customers_per_plant")
+    parser.add_argument("--threshold", type=float, default=150)
+    parser.add_argument("--seconds", type=int, default=10)
+    args = parser.parse_args()
+
+    with open(DATA_DIR / "locations_smurfit.json", 'r', encoding='utf-8') as f:
+        plants = json.load(f)
+    dm = DataManager(plants['paper_plant'], plants['carton_plants'], DATA_DIR / "cliente_ubi.json")
+    solver = LogisticsSolver(dm.get_optimized_locations(args.customers, args.threshold))
+    print(f"Nodos: {len(solver.nodes)} | presupuesto: {args.seconds}s por modo\n")
+
+    results = [run(solver, native=False, seconds=args.seconds), run(solver, native=True, seconds=args.seconds)]
+    for r in results:
+        print(json.dumps(r))
+    speedup = results[1]["branches_per_s"] / max(results[0]["branches_per_s"], 1e-9)
+    print(f"\nAceleración (ramas/s): x{speedup:.2f}")
+
+
+if __name__ == "__main__":
+    main()
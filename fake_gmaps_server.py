@@ -0,0 +1,123 @@
+"""
+Servidor Distance Matrix / Directions falso para pruebas locales sin consumir cuota de Google.
+
+Uso:
+    python fake_gmaps_server.py --port 8765 --fail-rate 0.1 --latency 0.1
+    GOOGLE_MAPS_API_KEY=AIzaFAKE GOOGLE_MAPS_BASE_URL=http://127.0.0.1:8765 python main.py
+
+Responde con la distancia Haversine x 1.3 (factor de sinuosidad típico por carretera),
+aplica los límites de elementos de la API real y puede inyectar fallos aleatorios.
+Directions devuelve una polilínea densa (un vértice cada ~DIRECTIONS_STEP_M) que
+serpentea alrededor de la recta; `--latency` simula el tiempo de ida y vuelta.
+"""
+import argparse
+import json
+import random
+import time
+import numpy as np
+import polyline
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from src.utils.geo import haversine_kernel
+
+ROAD_FACTOR = 1.3
+MAX_ELEMENTS = 100
+DIRECTIONS_STEP_M = 200
+
+
+def _parse_points(value):
+    points = []
+    for chunk in value.split('|'):
+        lat, lng = chunk.split(',')
+        points.append((float(lat), float(lng)))
+    return points
+
+
+def _fake_route(origin, destination):
+    """Polilínea codificada con oscilaciones laterales (similar en densidad a una real)."""
+    meters = float(haversine_kernel(*origin, *destination))
+    n = max(2, int(meters * ROAD_FACTOR / DIRECTIONS_STEP_M))
+    t = np.linspace(0, 1, n)
+    lat = origin[0] + (destination[0] - origin[0]) * t
+    lng = origin[1] + (destination[1] - origin[1]) * t
+    wiggle = 0.01 * np.sin(t * np.pi * 12) * np.sin(t * np.pi)
+    return polyline.encode(list(zip(lat + wiggle, lng - wiggle)))
+
+
+class FakeDistanceMatrixHandler(BaseHTTPRequestHandler):
+    fail_rate = 0.0
+    latency = 0.0
+    request_count = 0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/maps/api/directions/json":
+            self._directions(parse_qs(url.query))
+            return
+        if url.path != "/maps/api/distancematrix/json":
+            self.send_error(404)
+            return
+        FakeDistanceMatrixHandler.request_count += 1
+        time.sleep(self.latency)
+        params = parse_qs(url.query)
+        origins = _parse_points(params['origins'][0])
+        destinations = _parse_points(params['destinations'][0])
+
+        if random.random() < self.fail_rate:
+            body = {"status": "UNKNOWN_ERROR", "rows": []}
+        elif len(origins) * len(destinations) > MAX_ELEMENTS:
+            body = {"status": "MAX_ELEMENTS_EXCEEDED", "rows": []}
+        else:
+            rows = []
+            for o_lat, o_lng in origins:
+                elements = []
+                for d_lat, d_lng in destinations:
+                    meters = int(haversine_kernel(o_lat, o_lng, d_lat, d_lng) * ROAD_FACTOR)
+                    elements.append({"status": "OK",
+                                     "distance": {"value": meters, "text": f"{meters / 1000:.1f} km"},
+                                     "duration": {"value": meters // 20, "text": ""}})
+                rows.append({"elements": elements})
+            body = {"status": "OK", "rows": rows,
+                    "origin_addresses": [""] * len(origins), "destination_addresses": [""] * len(destinations)}
+
+        self._send(body)
+
+    def _directions(self, params):
+        FakeDistanceMatrixHandler.request_count += 1
+        time.sleep(self.latency)
+        origin = _parse_points(params['origin'][0])[0]
+        destination = _parse_points(params['destination'][0])[0]
+        if random.random() < self.fail_rate:
+            body = {"status": "UNKNOWN_ERROR", "routes": []}
+        else:
+            body = {"status": "OK", "routes": [{"overview_polyline": {"points": _fake_route(origin, destination)}}]}
+        self._send(body)
+
+    def _send(self, body):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8765, fail_rate=0.0, latency=0.0):
+    FakeDistanceMatrixHandler.fail_rate = fail_rate
+    FakeDistanceMatrixHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeDistanceMatrixHandler)
+    print(f"Fake Distance Matrix escuchando en http://127.0.0.1:{port} (fail_rate={fail_rate}, latency={latency}s)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos de espera por petición")
+    args = parser.parse_args()
+    serve(args.port, args.fail_rate, args.latency)
@@ -1,10 +1,13 @@
-import json
 import networkx as nx
 import matplotlib.pyplot as plt
 from pathlib import Path
+from src.utils.graph_layout import build_route_graph, compute_layout, short_label
+from src.utils.route_export import load_route_dicts
 
-# Paths
-DATA_FILE = Path("outputs/results/optimized_routes.json")
+# Paths (export compacto de main.py; el JSON antiguo sigue siendo válido)
+DATA_FILE = next((p for p in (Path("outputs/results/optimized_routes.ndjson"),
+                              Path("outputs/results/optimized_routes.json")) if p.exists()),
+                 Path("outputs/results/optimized_routes.ndjson"))
 OUTPUT_FILE = Path("outputs/results/Logistics_Graph_Static.png")
 
 def generate_static_graph():
@@ -13,25 +16,12 @@ def generate_static_graph():
         return
 
     print("Cargando rutas optimizadas...")
-    with open(DATA_FILE, 'r', encoding='utf-8') as f:
-        routes = json.load(f)
+    routes, _ = load_route_dicts(DATA_FILE)
 
-    G = nx.DiGraph()
+    G, unique_nodes = build_route_graph(routes)
 
-    # Recopilar todos los nodos y sus atributos
-    unique_nodes = {}
-    for route in routes:
-        for node in route:
-            unique_nodes[node['id']] = node
-            G.add_node(node['id'], name=node['name'], type=node['type'])
-
-    # Añadir aristas
-    for route in routes:
-        for j in range(len(route) - 1):
-            G.add_edge(route[j]['id'], route[j+1]['id'])
-
-    # Generar layout compacto
-    pos = nx.spring_layout(G, k=0.15, iterations=150, seed=42)
+    # Layout compartido con el grafo interactivo (cacheado por contenido de las rutas)
+    pos = compute_layout(routes, graph=G, unique_nodes=unique_nodes)
 
     # Preparar listas de estilos
     node_colors = []
@@ -42,9 +32,7 @@ def generate_static_graph():
         n_data = unique_nodes[node_id]
         
         # Limpieza de textos (Romper en dos lineas si es necesario)
-        words = n_data['name'].replace('Smurfit Westrock ', '').split()
-        short_name = "\n".join(words[:2]) if len(words) > 1 else words[0] if words else ""
-        labels[node_id] = short_name
+        labels[node_id] = short_label(n_data['name'])
 
         # Asignación de colores fieles a la imagen de referencia
         if n_data['type'] == 'depot':
@@ -1,4 +1,4 @@
-import json
+import argparse
 import sys
 from pathlib import Path
 
@@ -7,73 +7,58 @@ project_root = str(Path(__file__).resolve().parent)
 if project_root not in sys.path:
     sys.path.append(project_root)
 
-from src.engine.solver import LogisticsSolver
-from src.utils.visualizer import Visualizer
-from src.utils.data_manager import DataManager
-from src.config import RESULTS_DIR, DATA_DIR
+from src.pipeline import solve_routes, add_warm_start_flags
+from src.utils.profiling import metrics
+from src.config import RESULTS_DIR, LOGS_DIR, WARM_START
 
-def run_optimization():
+def run_optimization(warm_start=WARM_START):
+    metrics.reset("optimization")
+    with metrics.run():
+        _run_pipeline(warm_start)
+    metrics_json = metrics.write_json(RESULTS_DIR / "run_metrics.json")
+    metrics.write_openmetrics(LOGS_DIR / "run_metrics.prom")
+    print(f"⏱️ Métricas de la ejecución en: {metrics_json}")
+
+def _run_pipeline(warm_start):
     print("\n" + "🚀 " * 20)
     print("Logistics Optimizer - Strategic Overhaul Active")
     print("🚀 " * 20 + "\n")
 
-    # 1. Rutas de Archivos
-    plants_file = DATA_DIR / "locations_smurfit.json"
-    clients_file = DATA_DIR / "cliente_ubi.json"
-
-    if not plants_file.exists() or not clients_file.exists():
-        print(f"❌ Error: Faltan archivos de datos en {DATA_DIR}")
+    # 1-5. Selección de clientes (hasta 4 por planta en la ruta de vuelta a Mengíbar),
+    # resolución (incremental sobre la solución anterior solo con --warm-start) y exportación
+    solver, routes = solve_routes(max_customers_per_plant=4, threshold_km=100, warm_start=warm_start)
+    if solver is None:
         return
 
-    # 2. Cargar Plantas y Sede
-    with open(plants_file, 'r', encoding='utf-8') as f:
-        plants_data = json.load(f)
-
-    # 3. Data Engineering: Selección Inteligente de Clientes (Filtro de Retorno)
-    dm = DataManager(
-        paper_plant=plants_data['paper_plant'],
-        carton_plants=plants_data['carton_plants'],
-        clients_file=clients_file
-    )
-    
-    # 1. Cargar y seleccionar clientes
-    # Seleccionamos hasta 4 clientes por planta que estén en la ruta de vuelta a Mengíbar
-    enriched_data = dm.get_optimized_locations(max_customers_per_plant=4, threshold_km=100)
-    
-    # 2. Solver
-    solver = LogisticsSolver(enriched_data)
-    
-    print(f"\nEngine Status: {'GPS Real' if solver.is_real_road else 'Haversine Matrix'}")
-    print(f"Nodos totales a optimizar: {len(solver.nodes)}")
-
-    # 5. Ejecutar Optimización
-    routes = solver.solve()
-
     if routes:
         print(f"\n✅ ÉXITO: Se han generado {len(routes)} rutas logísticas integradas.")
-        
-        # Guardar resultados
-        output_json = RESULTS_DIR / "optimized_routes.json"
-        with open(output_json, 'w', encoding='utf-8') as f:
-            json.dump(routes, f, indent=2, ensure_ascii=False)
 
-        # 6. Visualización con Dashboard
-        visualizer = Visualizer(routes, solver.distance_matrix)
-        map_path = visualizer.create_map("Logistics_Dashboard.html")
-        graph_path = visualizer.create_plotly_graph("Logistics_Graph.html")
+        # 6. Visualización con Dashboard (incluye la descarga de polilíneas).
+        # Import diferido: la pila de visualización solo se carga aquí
+        from src.utils.visualizer import Visualizer
+        visualizer = Visualizer(routes, solver.distance_matrix, kpis=solver.kpis)
+        with metrics.stage("map_render"):
+            map_path = visualizer.create_map("Logistics_Dashboard.html")
+        with metrics.stage("graph_render"):
+            graph_path = visualizer.create_plotly_graph("Logistics_Graph.html")
         
         print(f"\n🔎 Visualización del Mapa generada en: {map_path}")
         print(f"📊 Visualización del Grafo (Plotly) en: {graph_path}")
         print("\n" + "="*50)
         print("RESUMEN DE OPERACIÓN")
         print("="*50)
+        # KPIs calculados una sola vez sobre la solución (compartidos con el mapa y el grafo)
+        kpis = solver.kpis
         for i, route in enumerate(routes):
-            # Calcular km reales para el log
-            dist_km = sum(solver.distance_matrix[n1['matrix_idx']][n2['matrix_idx']] 
-                         for n1, n2 in zip(route, route[1:])) / 1000
-            print(f"Ruta {i+1} (D->{route[1]['name']}->Clientes->D): {dist_km:.2f} km")
+            print(f"Ruta {i+1} (D->{route[1]['name']}->Clientes->D): {kpis.route_m[i] / 1000:.2f} km "
+                  f"(vacío {kpis.empty_return_m[i] / 1000:.1f} km, {kpis.utilisation[i]:.0%} del límite)")
+        summary = kpis.summary()
+        print(f"Total: {summary['total_km']:.2f} km | retorno en vacío {summary['empty_return_km']:.2f} km "
+              f"| desvío por clientes {summary['detour_km']:.2f} km")
     else:
         print("\n❌ FALLO: El optimizador no pudo encontrar una solución válida con las restricciones actuales.")
 
 if __name__ == "__main__":
-    run_optimization()
+    parser = argparse.ArgumentParser(description="Logistics Optimizer")
+    add_warm_start_flags(parser)
+    run_optimization(parser.parse_args().warm_start)
@@ -10,6 +10,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 # API Keys
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+# Permite apuntar a un servidor Distance Matrix local (pruebas / fake_gmaps_server.py)
+GOOGLE_MAPS_BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com")
 
 # Data Paths
 DATA_DIR = BASE_DIR / "data"
@@ -20,11 +22,84 @@ OUTPUT_DIR = BASE_DIR / "outputs"
 RESULTS_DIR = OUTPUT_DIR / "results"
 MAPS_DIR = OUTPUT_DIR / "maps"
 LOGS_DIR = BASE_DIR / "logs"
+CACHE_DIR = BASE_DIR / "cache"
+
+# Backhaul corridor: radio de desvío cubierto por el índice precalculado de DataManager
+CORRIDOR_INDEX_KM = 250
+
+# Asignación cliente -> planta: "global" (cada cliente a una sola planta, coste mínimo
+# con capacidad max_customers_per_plant) o "per_plant" (top-k independiente por planta)
+CUSTOMER_ASSIGNMENT = "global"
+ASSIGNMENT_MAX_CELLS = 20_000_000  # Por encima, asignación voraz por desvío en lugar de la exacta
+
+# Geocoder postal (ficheros GeoNames en DATA_DIR; los que no existan se ignoran)
+GEOCODER_SOURCES = ["ES.txt", "PT.txt"]
+GEOCODER_PREFIX_LENGTHS = (4, 3, 2)
+
+# Distance cache (pares origen-destino persistidos en SQLite)
+DISTANCE_CACHE_FILE = CACHE_DIR / "distance_cache.sqlite"
+DISTANCE_CACHE_TTL_DAYS = 90     # Las carreteras apenas cambian
+CACHE_COORD_DECIMALS = 5         # ~1 m de resolución en la clave
+
+# Distance Matrix API: límites por petición y concurrencia
+DM_MAX_ORIGINS = 25
+DM_MAX_DESTINATIONS = 25
+DM_MAX_ELEMENTS = 100
+DM_QPS = 10                      # Token bucket compartido entre hilos
+DM_MAX_WORKERS = 8
+DM_MAX_RETRIES = 4
+DM_BACKOFF_BASE = 0.5            # Segundos (se duplica en cada reintento)
+
+# Polilíneas del dashboard (Directions API): caché persistente y descarga concurrente
+POLYLINE_CACHE_FILE = CACHE_DIR / "polyline_cache.sqlite"
+POLYLINE_CACHE_TTL_DAYS = 90
+POLYLINE_MAX_WORKERS = 8         # Comparten el token bucket de DM_QPS
+POLYLINE_SIMPLIFY_M = 25         # Tolerancia Douglas-Peucker al incrustar en el mapa
+
+# Dashboard: "detailed" (un objeto por nodo/tramo), "clustered" (GeoJSON por ruta +
+# clústeres de marcadores) o "auto" (clustered a partir de MAP_CLUSTER_MIN_STOPS paradas)
+MAP_MODE = "auto"
+MAP_CLUSTER_MIN_STOPS = 300
+MAP_SIDEBAR_MAX_LEGS = 40        # Desglose máximo por ruta en la tabla lateral (modo clustered)
+
+# Layout de los grafos (Plotly y PNG estático): "hierarchical", "geo" o "spring"
+GRAPH_LAYOUT = "hierarchical"
+LAYOUT_CACHE_TTL_DAYS = 30       # Layouts en cache/layouts sin usar más tiempo se borran
+LAYOUT_CACHE_MAX_FILES = 200     # Máximo de layouts en disco (se borran los usados hace más tiempo)
+
+# Servicio residente (python -m src.service)
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8780
+SERVICE_WORKERS = 2              # Procesos de búsqueda en paralelo
+SERVICE_JOB_TTL_S = 3600         # Los trabajos terminados se olvidan pasado este tiempo
+SERVICE_MAX_JOBS = 500           # Máximo de trabajos en memoria (se purgan los terminados más antiguos)
+
+# Instrumentación: LOGISTICS_PROFILE=cprofile vuelca un perfil .prof por ejecución
+PROFILE_MODE = os.getenv("LOGISTICS_PROFILE", "").lower()
 
 # Solver config
-MAX_SEARCH_TIME = 40
 DIST_LIMIT = 4000000
+MAX_SEARCH_TIME = 40             # Tope del presupuesto de búsqueda (s)
+MIN_SEARCH_TIME = 3
+SEARCH_TIME_PER_NODE = 0.5       # Escalado automático del presupuesto con el nº de nodos
+NO_IMPROVEMENT_FRACTION = 0.25   # Ventana sin mejora, como fracción del límite de tiempo
+INCREMENTAL_SEARCH_TIME = 5      # Fase de mejora tras una re-optimización incremental (s)
+SPARSE_NEIGHBORS = 30            # k vecinos por nodo en el modelo de arcos candidatos
+SPARSE_AUTO_MIN_NODES = 1000     # A partir de este tamaño el modelo disperso se activa solo
+WARM_START = False               # Re-optimizar sobre optimized_routes.ndjson si existe (opt-in: --warm-start)
+
+# Descomposición por plantas / grupos geográficos (DecompositionSolver)
+DECOMPOSITION_PLANTS_PER_CLUSTER = 4
+
+# Distance matrix engine
+DISTANCE_MODE = "haversine"      # 'haversine' | 'equirectangular'
+DISTANCE_DTYPE = "float64"       # 'float64' | 'float32' | 'int32' (metros)
+DISTANCE_BLOCK_ROWS = 1024       # Filas por bloque (acota memoria temporal)
 
-# Create folders if they don't exist
-for folder in [OUTPUT_DIR, RESULTS_DIR, MAPS_DIR, LOGS_DIR]:
-    folder.mkdir(parents=True, exist_ok=True)
+def ensure_dirs(*folders):
+    """
+    Crea las carpetas indicadas (por defecto todas las de salida y caché).
+    Se llama justo antes de escribir: importar la configuración no toca el disco.
+    """
+    for folder in folders or (OUTPUT_DIR, RESULTS_DIR, MAPS_DIR, LOGS_DIR, CACHE_DIR):
+        Path(folder).mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,92 @@
+import numpy as np
+from src.config import DISTANCE_BLOCK_ROWS
+
+
+class CandidateArcs:
+    """
+    Grafo disperso de arcos candidatos en formato CSR (indptr / indices int32).
+    Un cliente solo puede ir en el camión de su planta, así que los vecinos se buscan
+    dentro de cada familia planta + clientes: cada nodo conserva sus k más cercanos de
+    la familia, los arcos se simetrizan (todo nodo es alcanzable desde sus propios
+    vecinos) y se añaden depósito -> plantas y cualquier nodo -> depósito. La búsqueda
+    local no pierde tiempo en arcos absurdos (cliente gallego -> planta de Alicante) y
+    el grafo tiene O(N·k) arcos.
+    """
+
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def nnz(self):
+        return len(self.indices)
+
+    def neighbors(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    @classmethod
+    def build(cls, distance_matrix, k, plant_indices, parent_idx, extra_arcs=None, block_rows=DISTANCE_BLOCK_ROWS):
+        """
+        Construye los candidatos por bloques de filas de cada familia con argpartition
+        (sin ordenar filas completas). `parent_idx` mapea cliente -> índice de su planta.
+        `extra_arcs` (orígenes, destinos) añade arcos obligatorios, p.ej. los de la
+        solución inicial, para que sea representable en el grafo disperso.
+        """
+        n = distance_matrix.shape[0]
+        plants = np.asarray(plant_indices, dtype=np.int32)
+        family = {p: [p] for p in plant_indices}
+        for c, p in parent_idx.items():
+            if p is not None:
+                family[p].append(c)
+
+        origins, targets = [np.zeros(len(plants), dtype=np.int32)], [plants]   # Depósito -> plantas
+        for members in family.values():
+            members = np.asarray(members, dtype=np.int32)
+            kk = min(k, len(members) - 1)
+            if kk <= 0:
+                continue
+            for start in range(0, len(members), block_rows):
+                rows = members[start:start + block_rows]
+                block = np.asarray(distance_matrix[np.ix_(rows, members)], dtype=np.float64)
+                local = np.arange(len(rows))
+                block[local, start + local] = np.inf     # Sin auto-arcos entre los vecinos
+                nearest = np.argpartition(block, kk - 1, axis=1)[:, :kk]
+                origins.append(np.repeat(rows, kk))
+                targets.append(members[nearest].ravel())
+
+        if extra_arcs is not None:
+            origins.append(np.asarray(extra_arcs[0], dtype=np.int32))
+            targets.append(np.asarray(extra_arcs[1], dtype=np.int32))
+        origins, targets = np.concatenate(origins), np.concatenate(targets)
+        others = np.arange(1, n, dtype=np.int32)
+        # Simetrizar y permitir volver al depósito (fin de ruta) desde cualquier nodo
+        src = np.concatenate((origins, targets, others))
+        dst = np.concatenate((targets, origins, np.zeros(n - 1, dtype=np.int32)))
+        keep = src != dst
+        keys = np.unique(src[keep].astype(np.int64) * n + dst[keep])   # Ordenadas por origen y destino
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(keys // n, minlength=n))
+        return cls(indptr, (keys % n).astype(np.int32))
+
+    def transit_matrix(self, distance_matrix, forbidden):
+        """
+        Matriz de tránsito (listas Python) para RegisterTransitMatrix: de la matriz solo se
+        leen las posiciones CSR (O(nnz)); las demás celdas valen `forbidden` y comparten un
+        único objeto int, así que cada celda cuesta un puntero y no un entero Python. El
+        auto-arco vale 0 (ruta vacía del depósito, nodo no visitado).
+        """
+        n = len(self)
+        values = np.asarray(distance_matrix[np.repeat(np.arange(n), np.diff(self.indptr)), self.indices])
+        values = values.astype(np.int64).tolist()
+        cols, bounds = self.indices.tolist(), self.indptr.tolist()
+        rows = []
+        for i in range(n):
+            row = [forbidden] * n
+            for c, v in zip(cols[bounds[i]:bounds[i + 1]], values[bounds[i]:bounds[i + 1]]):
+                row[c] = v
+            row[i] = 0
+            rows.append(row)
+        return rows
@@ -0,0 +1,114 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from src.engine.solver import LogisticsSolver
+from src.engine.search_budget import SearchBudget
+from src.config import DECOMPOSITION_PLANTS_PER_CLUSTER
+
+MODES = ("plant", "geo")
+
+
+def _cluster_worker(sub_data, sub_matrix, budget):
+    """Resuelve un sub-VRP (un grupo de plantas con sus clientes) en un proceso hijo."""
+    solver = LogisticsSolver(sub_data, distance_matrix=sub_matrix)
+    routes = solver.solve(budget=budget or SearchBudget.for_nodes(len(solver.nodes)), as_indices=True)
+    stats = {k: v for k, v in (solver.last_run or {}).items() if k != "objective_trace"}
+    stats["plants"] = [p['id'] for p in sub_data['carton_plants']]
+    stats["nodes"] = len(solver.nodes)
+    stats["routes"] = [route.tolist() for route in routes] if routes else []
+    return stats
+
+
+def kmeans_plants(plants, k, seed=42, iterations=50):
+    """K-means (Lloyd) sobre las coordenadas de las plantas, proyectadas equirectangularmente."""
+    coords = np.array([(p['lat'], p['lng']) for p in plants], dtype=np.float64)
+    xy = np.column_stack((coords[:, 1] * np.cos(np.radians(coords[:, 0].mean())), coords[:, 0]))
+    rng = np.random.default_rng(seed)
+    centers = xy[rng.choice(len(xy), size=k, replace=False)]
+    for _ in range(iterations):
+        labels = np.argmin(((xy[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2), axis=1)
+        new_centers = np.array([xy[labels == c].mean(axis=0) if np.any(labels == c) else centers[c] for c in range(k)])
+        if np.allclose(new_centers, centers):
+            break
+        centers = new_centers
+    return labels
+
+
+class DecompositionSolver:
+    """
+    Descomposición de instancias grandes. Como cada cliente ya está ligado a su
+    planta (`parent_cp`), el problema se parte por planta o por grupos geográficos
+    de plantas; los sub-VRP se resuelven en paralelo sobre submatrices de la matriz
+    global y sus rutas se fusionan tal cual.
+
+    La descomposición es exacta: cada cliente solo admite el camión de su planta y hay
+    un camión por planta, así que las rutas de plantas distintas no comparten nada y el
+    óptimo global es la unión de los óptimos por planta. No hace falta (ni serviría de
+    nada) una pasada de mejora entre grupos; agrupar plantas (`mode="geo"`) solo cambia
+    cuántos procesos se lanzan y cómo se reparte el presupuesto.
+    """
+
+    def __init__(self, solver, mode="plant", plants_per_cluster=DECOMPOSITION_PLANTS_PER_CLUSTER, workers=None):
+        if mode not in MODES:
+            raise ValueError(f"Modo de descomposición desconocido: {mode!r} (usa {' o '.join(MODES)})")
+        self.solver = solver
+        self.mode = mode
+        self.plants_per_cluster = plants_per_cluster
+        self.workers = workers or os.cpu_count() or 1
+        self.cluster_stats = []
+
+    def partition(self):
+        """Lista de grupos de índices de planta (posición en carton_plants)."""
+        plants = self.solver.locations_data['carton_plants']
+        if self.mode == "plant" or len(plants) <= self.plants_per_cluster:
+            return [[i] for i in range(len(plants))] if self.mode == "plant" else [list(range(len(plants)))]
+        k = math.ceil(len(plants) / self.plants_per_cluster)
+        labels = kmeans_plants(plants, k)
+        return [list(np.flatnonzero(labels == c)) for c in range(k) if np.any(labels == c)]
+
+    def _global_offsets(self):
+        """Índice global de cada planta (mismo orden que NodeTable.from_locations) y su nº de clientes."""
+        offsets, idx = [], 1
+        for plant in self.solver.locations_data['carton_plants']:
+            n_customers = len(plant.get('customers', []))
+            offsets.append((idx, n_customers))
+            idx += 1 + n_customers
+        return offsets
+
+    def _subproblem(self, plants, offsets):
+        """(índices globales, datos, submatriz) del sub-VRP de las plantas dadas, en el orden del sub-solver."""
+        data = self.solver.locations_data
+        global_idx = [0]
+        for p in plants:
+            first, n_customers = offsets[p]
+            global_idx.extend(range(first, first + 1 + n_customers))
+        global_idx = np.array(global_idx)
+        sub_data = {"paper_plant": data['paper_plant'], "carton_plants": [data['carton_plants'][p] for p in plants]}
+        return global_idx, sub_data, self.solver.distance_matrix[np.ix_(global_idx, global_idx)]
+
+    def solve(self, budget=None):
+        """Devuelve rutas fusionadas (nodos globales); estadísticas por grupo en `cluster_stats`."""
+        offsets = self._global_offsets()
+        clusters = self.partition()
+        start = time.perf_counter()
+
+        tasks = [self._subproblem(cluster, offsets) for cluster in clusters]
+
+        print(f"Descomposición ({self.mode}): {len(tasks)} sub-VRP en {min(self.workers, len(tasks))} procesos...")
+        merged, self.cluster_stats = [], []
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+            futures = [pool.submit(_cluster_worker, sub_data, sub_matrix, budget) for _, sub_data, sub_matrix in tasks]
+            for (global_idx, _, _), future in zip(tasks, futures):
+                stats = future.result()
+                merged.extend([[int(global_idx[i]) for i in route] for route in stats.pop("routes")])
+                self.cluster_stats.append(stats)
+
+        routes = [route for route in merged if len(route) > 2]
+        self.solver.record_solution(routes)
+        self.solver.last_run = {
+            "stop_reason": "decomposition", "objective": int(self.solver.kpis.total_m),
+            "wall_time_s": round(time.perf_counter() - start, 3), "clusters": self.cluster_stats,
+        }
+        return self.solver.nodes.to_routes(routes)
@@ -0,0 +1,89 @@
+import numpy as np
+
+# Códigos de tipo de nodo (int8) y su nombre en las vistas exportadas
+DEPOT, CARTON_PLANT, CUSTOMER = 0, 1, 2
+TYPE_NAMES = ("depot", "carton_plant", "customer")
+
+
+class NodeTable:
+    """
+    Tabla compacta de nodos (struct-of-arrays): tipo int8, planta padre int32 (-1 si
+    no tiene) y coordenadas float64, más ids y nombres. El solver trabaja solo con
+    estos arrays e índices enteros; los diccionarios de nodo (con todos los campos de
+    origen) se construyen bajo demanda al indexar la tabla, es decir, solo en la
+    frontera de exportación (JSON, mapas, grafos).
+    """
+
+    def __init__(self, type_code, parent, lat, lng, ids, names, records):
+        self.type_code = type_code
+        self.parent = parent
+        self.lat = lat
+        self.lng = lng
+        self.ids = ids
+        self.names = names
+        self._records = records   # Referencias a los dicts de entrada (sin copiar); None al leer un export
+        self._views = {}
+
+    @classmethod
+    def from_locations(cls, data):
+        """Construye la tabla a partir del JSON de entrada (depósito, plantas y sus clientes)."""
+        records = [data['paper_plant']]
+        types = [DEPOT]
+        parents = [-1]
+        ids = ["DEPOT"]
+        for plant in data['carton_plants']:
+            plant_idx = len(records)
+            records.append(plant)
+            types.append(CARTON_PLANT)
+            parents.append(-1)
+            ids.append(plant['id'])
+            for customer in plant.get('customers', []):
+                records.append(customer)
+                types.append(CUSTOMER)
+                parents.append(plant_idx)
+                ids.append(customer['id'])
+
+        n = len(records)
+        return cls(
+            type_code=np.array(types, dtype=np.int8),
+            parent=np.array(parents, dtype=np.int32),
+            lat=np.fromiter((r['lat'] for r in records), dtype=np.float64, count=n),
+            lng=np.fromiter((r['lng'] for r in records), dtype=np.float64, count=n),
+            ids=ids,
+            names=[r.get('name', "") for r in records],
+            records=records,
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, idx):
+        """Vista dict del nodo `idx` (mismos campos que la lista de dicts original), memorizada."""
+        idx = int(idx)
+        view = self._views.get(idx)
+        if view is None:
+            code = self.type_code[idx]
+            if self._records is None:
+                record = {"id": self.ids[idx], "name": self.names[idx],
+                          "lat": float(self.lat[idx]), "lng": float(self.lng[idx])}
+            else:
+                record = self._records[idx]
+            if code == CARTON_PLANT:
+                record = {k: v for k, v in record.items() if k != 'customers'}
+            view = {**record, "id": self.ids[idx], "type": TYPE_NAMES[code]}
+            if code == CUSTOMER:
+                view["parent_cp"] = self.ids[self.parent[idx]]
+            view["matrix_idx"] = idx
+            self._views[idx] = view
+        return view
+
+    def indices_of(self, code):
+        """Índices (int32) de los nodos de un tipo."""
+        return np.flatnonzero(self.type_code == code).astype(np.int32)
+
+    def to_routes(self, index_routes):
+        """Rutas de índices -> rutas de dicts (solo para exportar / visualizar)."""
+        return [[self[i] for i in route] for route in index_routes]
@@ -0,0 +1,141 @@
+import os
+import queue
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from src.engine.solver import LogisticsSolver, GREEDY_FIRST_SOLUTION, DEFAULT_METAHEURISTIC
+from src.engine.search_budget import SearchBudget
+
+# Combinaciones (estrategia inicial, metaheurística) que se reparten entre los workers
+# Las inserciones encabezan la lista: son las que mejor respetan precedencia y disyunciones
+DEFAULT_STRATEGIES = [
+    ("PARALLEL_CHEAPEST_INSERTION", "GUIDED_LOCAL_SEARCH"),
+    ("LOCAL_CHEAPEST_INSERTION", "TABU_SEARCH"),
+    ("SEQUENTIAL_CHEAPEST_INSERTION", "GUIDED_LOCAL_SEARCH"),
+    ("PARALLEL_CHEAPEST_INSERTION", "SIMULATED_ANNEALING"),
+    ("LOCAL_CHEAPEST_INSERTION", "GUIDED_LOCAL_SEARCH"),
+    ("PATH_CHEAPEST_ARC", "GUIDED_LOCAL_SEARCH"),
+    ("SAVINGS", "SIMULATED_ANNEALING"),
+    ("GLOBAL_CHEAPEST_ARC", "TABU_SEARCH"),
+]
+
+
+def _report_pid(pid_queue):
+    """Inicializador de cada worker: publica su pid para poder terminarlo tras un timeout."""
+    pid_queue.put(os.getpid())
+
+
+def _terminate_workers(pid_queue, count):
+    """Termina los `count` workers con los que se creó el pool (pids publicados por _report_pid)."""
+    for _ in range(count):
+        try:
+            pid = pid_queue.get(timeout=1)
+        except queue.Empty:
+            break
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def _portfolio_worker(shm_name, shape, dtype, locations_data, sparse_k, config, budget):
+    """Resuelve en un proceso hijo leyendo la matriz desde memoria compartida."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    matrix = None
+    try:
+        matrix = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        solver = LogisticsSolver(locations_data, distance_matrix=matrix, sparse_k=sparse_k)
+        start = time.perf_counter()
+        routes = solver.solve(budget=budget, as_indices=True, **config)
+        stats = {k: v for k, v in (solver.last_run or {}).items() if k != "objective_trace"}
+        stats.update(config)
+        stats["worker_time_s"] = round(time.perf_counter() - start, 3)
+        stats["pid"] = os.getpid()
+        # Solo índices: los nodos completos se reconstruyen en el proceso padre
+        stats["routes"] = [route.tolist() for route in routes] if routes else None
+        return stats
+    finally:
+        del matrix
+        shm.close()
+
+
+class PortfolioSolver:
+    """
+    Lanza N procesos sobre el mismo modelo, cada uno con su estrategia inicial,
+    metaheurística y semilla, y se queda con la mejor solución dentro del presupuesto.
+    La matriz de distancias se publica una sola vez en memoria compartida en lugar de
+    serializarse hacia cada worker, pero cada worker sigue construyendo su matriz de
+    tránsito (RegisterTransitMatrix solo acepta listas Python y OR-Tools guarda su copia
+    int64): con el modelo disperso (`sparse_k`) las celdas no candidatas comparten un
+    único entero, con el denso hay un entero Python por celda. En el modelo disperso un
+    worker más arranca de greedy_routes() (GREEDY_FIRST_SOLUTION) y los demás conservan
+    su estrategia de OR-Tools, para no perder diversidad en la solución inicial.
+    """
+
+    def __init__(self, solver, workers=None, strategies=DEFAULT_STRATEGIES):
+        self.solver = solver
+        # En el modelo disperso las inserciones de OR-Tools dejan clientes sin servir: el
+        # primer worker arranca de greedy_routes() y el resto conserva su estrategia
+        if solver.sparse_k and all(first != GREEDY_FIRST_SOLUTION for first, _ in strategies):
+            strategies = [(GREEDY_FIRST_SOLUTION, DEFAULT_METAHEURISTIC)] + list(strategies)
+        self.workers = workers or min(len(strategies), os.cpu_count() or 1)
+        self.strategies = strategies
+        self.worker_stats = []
+        self.best = None
+
+    def _configs(self):
+        for w in range(self.workers):
+            first, meta = self.strategies[w % len(self.strategies)]
+            yield {"first_solution_strategy": first, "metaheuristic": meta, "seed": 1000 + w}
+
+    def solve(self, budget=None):
+        """Devuelve las rutas de la mejor solución; las estadísticas quedan en `worker_stats`."""
+        budget = budget or SearchBudget.for_nodes(len(self.solver.nodes))
+        matrix = np.ascontiguousarray(self.solver.distance_matrix)
+        shm = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+        try:
+            np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shm.buf)[:] = matrix
+            print(f"Portfolio: {self.workers} workers, presupuesto {budget}")
+            self.worker_stats = []
+            pid_queue = multiprocessing.Queue()
+            pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_report_pid, initargs=(pid_queue,))
+            timed_out = False
+            try:
+                futures = [
+                    pool.submit(_portfolio_worker, shm.name, matrix.shape, matrix.dtype,
+                                self.solver.locations_data, self.solver.sparse_k, config, budget)
+                    for config in self._configs()
+                ]
+                # Margen para arranque de procesos y construcción del modelo
+                for future in as_completed(futures, timeout=budget.time_limit_s + 30):
+                    try:
+                        self.worker_stats.append(future.result())
+                    except Exception as e:
+                        self.worker_stats.append({"error": str(e), "routes": None, "objective": None})
+            except TimeoutError:
+                timed_out = True
+                print("AVISO: algunos workers del portfolio no respondieron a tiempo; se terminan.")
+            finally:
+                # Salir de un `with` esperaría a los workers colgados: se cancelan los
+                # pendientes y, si hubo timeout, se matan los procesos que siguen vivos
+                pool.shutdown(wait=not timed_out, cancel_futures=True)
+                if timed_out:
+                    _terminate_workers(pid_queue, self.workers)
+                pid_queue.close()
+        finally:
+            shm.close()
+            shm.unlink()
+
+        solved = [s for s in self.worker_stats if s.get("routes")]
+        if not solved:
+            return None
+        self.best = min(solved, key=lambda s: s["objective"])
+        for s in self.worker_stats:
+            print(f"  - {s.get('first_solution_strategy')}/{s.get('metaheuristic')} "
+                  f"seed={s.get('seed')}: objetivo={s.get('objective')} ({s.get('stop_reason', s.get('error'))})")
+        self.solver.last_run = {k: v for k, v in self.best.items() if k != "routes"}
+        self.solver.record_solution(self.best["routes"])
+        return self.solver.nodes.to_routes(self.best["routes"])
@@ -0,0 +1,93 @@
+import numpy as np
+from src.config import DIST_LIMIT
+from src.engine.node_table import CUSTOMER, TYPE_NAMES
+
+
+class RouteKPIs:
+    """
+    KPIs de una solución calculados en una sola pasada vectorizada: las rutas (arrays de
+    índices de nodo) se concatenan y todas las distancias salen de una única indexación
+    `matrix[origen, destino]`; los totales por ruta, de un bincount. Lo consumen el
+    resumen de main.py, el panel lateral del mapa, los pesos del grafo, el servicio y
+    los escenarios, de modo que nadie vuelve a recorrer la matriz elemento a elemento.
+
+    - leg_m: distancia de cada tramo, plana (`legs(r)` da los de la ruta r)
+    - route_m: total por ruta
+    - empty_return_m: último tramo de cada ruta (vuelta en vacío al depósito)
+    - customers / customer_route / detour_m: clientes servidos, su ruta y su coste de
+      inserción d(prev, c) + d(c, next) - d(prev, next); detour_m es None sin matriz
+    - utilisation: route_m / DIST_LIMIT (fracción del límite de distancia por vehículo)
+    """
+
+    def __init__(self, routes, type_code, distance_matrix=None, leg_m=None, dist_limit=DIST_LIMIT):
+        self.routes = [np.asarray(r, dtype=np.int32) for r in routes]
+        n = len(self.routes)
+        lengths = np.fromiter((len(r) for r in self.routes), dtype=np.int64, count=n)
+        n_legs = np.maximum(lengths - 1, 0)
+        flat = np.concatenate(self.routes) if n else np.zeros(0, dtype=np.int32)
+        starts = np.concatenate(([0], np.cumsum(lengths)))
+        self.leg_offsets = np.concatenate(([0], np.cumsum(n_legs)))
+
+        # Posiciones de la lista plana que tienen anterior y siguiente dentro de su ruta
+        position = np.arange(len(flat)) - np.repeat(starts[:-1], lengths)
+        interior = (position > 0) & (position < np.repeat(lengths, lengths) - 1)
+
+        if leg_m is None:
+            same_route = np.ones(max(len(flat) - 1, 0), dtype=bool)
+            same_route[starts[1:-1] - 1] = False
+            origin, dest = flat[:-1][same_route], flat[1:][same_route]
+            leg_m = distance_matrix[origin, dest]
+        self.leg_m = np.asarray(leg_m, dtype=np.float64)
+
+        leg_route = np.repeat(np.arange(n), n_legs)
+        self.route_m = np.bincount(leg_route, weights=self.leg_m, minlength=n)
+        self.empty_return_m = np.zeros(n)
+        has_legs = n_legs > 0
+        self.empty_return_m[has_legs] = self.leg_m[self.leg_offsets[1:][has_legs] - 1]
+        self.utilisation = self.route_m / dist_limit
+
+        served = interior & (np.asarray(type_code)[flat] == CUSTOMER)
+        self.customers = flat[served]
+        self.customer_route = np.repeat(np.arange(n), lengths)[served]
+        self.detour_m = None
+        if distance_matrix is not None:
+            pos = np.flatnonzero(served)
+            prev, nxt = flat[pos - 1], flat[pos + 1]
+            self.detour_m = (np.asarray(distance_matrix[prev, self.customers], dtype=np.float64)
+                             + distance_matrix[self.customers, nxt] - distance_matrix[prev, nxt])
+
+    @classmethod
+    def from_dict_routes(cls, routes, distance_matrix=None, leg_m=None):
+        """KPIs de rutas como listas de dicts de nodo (usa `matrix_idx` y `type`)."""
+        index_routes = [[node['matrix_idx'] for node in route] for route in routes]
+        size = 1 + max((i for route in index_routes for i in route), default=-1)
+        type_code = np.full(size, -1, dtype=np.int8)
+        for route in routes:
+            for node in route:
+                type_code[node['matrix_idx']] = TYPE_NAMES.index(node['type'])
+        return cls(index_routes, type_code, distance_matrix, leg_m)
+
+    def __len__(self):
+        return len(self.routes)
+
+    def legs(self, r):
+        """Distancias (m) de los tramos de la ruta `r`, en orden."""
+        return self.leg_m[self.leg_offsets[r]:self.leg_offsets[r + 1]]
+
+    @property
+    def total_m(self):
+        return float(self.route_m.sum())
+
+    def summary(self):
+        """Totales de la solución en km (para métricas, servicio y escenarios)."""
+        km = lambda meters: round(float(meters) / 1000, 2)
+        return {
+            "routes": len(self),
+            "total_km": km(self.total_m),
+            "empty_return_km": km(self.empty_return_m.sum()),
+            "empty_return_share": round(float(self.empty_return_m.sum()) / self.total_m, 4) if self.total_m else 0.0,
+            "customers_served": int(len(self.customers)),
+            "detour_km": km(self.detour_m.sum()) if self.detour_m is not None else None,
+            "max_utilisation": round(float(self.utilisation.max()), 4) if len(self) else 0.0,
+            "mean_utilisation": round(float(self.utilisation.mean()), 4) if len(self) else 0.0,
+        }
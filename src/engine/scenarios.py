@@ -0,0 +1,141 @@
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import polars as pl
+from src.engine.solver import LogisticsSolver, DEFAULT_METAHEURISTIC
+from src.engine.search_budget import SearchBudget
+from src.config import RESULTS_DIR, ensure_dirs
+
+SELECTION_PARAMS = ("threshold_km", "max_customers_per_plant")
+
+
+def scenario_grid(**params):
+    """Producto cartesiano de parámetros: scenario_grid(threshold_km=[60, 100], max_customers_per_plant=[4, 6])."""
+    keys = list(params)
+    return [dict(zip(keys, values)) for values in itertools.product(*(params[k] for k in keys))]
+
+
+def _scenario_worker(scenario, sub_data, sub_matrix, is_real_road):
+    """Resuelve un escenario en un proceso hijo sobre su submatriz."""
+    solver = LogisticsSolver(sub_data, distance_matrix=sub_matrix, is_real_road=is_real_road)
+    budget = SearchBudget.for_nodes(
+        len(solver.nodes),
+        **{k: scenario[k] for k in ("time_limit_s", "no_improvement_s", "solution_limit") if k in scenario},
+    )
+    start = time.perf_counter()
+    routes = solver.solve(
+        budget=budget,
+        first_solution_strategy=scenario.get("first_solution_strategy"),
+        metaheuristic=scenario.get("metaheuristic", DEFAULT_METAHEURISTIC),
+        as_indices=True,
+    ) or []
+    solve_time = time.perf_counter() - start
+    return {
+        **scenario,
+        "nodes": len(solver.nodes),
+        "customers_selected": len(solver.customer_indices),
+        **solver.kpis.summary(),
+        "objective": (solver.last_run or {}).get("objective"),
+        "stop_reason": (solver.last_run or {}).get("stop_reason"),
+        "solve_time_s": round(solve_time, 3),
+    }
+
+
+class ScenarioRunner:
+    """
+    Barridos what-if sobre parámetros de DataManager y del solver. La selección de cada
+    combinación (umbral, nº de clientes) la hace DataManager.get_optimized_locations
+    (barata con el índice de pasillo), porque con la asignación "global" bajar el umbral
+    o el cupo puede mover un cliente a otra planta y un prefijo del superconjunto ya no
+    coincidiría. Solo la matriz se calcula una vez, sobre la unión de los nodos de todas
+    las selecciones; cada escenario usa una submatriz por indexación (por id de nodo).
+    """
+
+    def __init__(self, data_manager, workers=None):
+        self.data_manager = data_manager
+        self.workers = workers or os.cpu_count() or 1
+        self.results = None
+
+    def _selections(self, scenarios):
+        """Selección de DataManager por cada combinación distinta de parámetros de selección."""
+        selections = {}
+        for scenario in scenarios:
+            key = tuple(scenario[k] for k in SELECTION_PARAMS)
+            if key not in selections:
+                selections[key] = self.data_manager.get_optimized_locations(
+                    max_customers_per_plant=scenario["max_customers_per_plant"], threshold_km=scenario["threshold_km"])
+        return selections
+
+    @staticmethod
+    def _union(selections):
+        """Datos con todos los nodos (por id) de las selecciones, para calcular una sola matriz."""
+        first = next(iter(selections.values()))
+        plants, seen = {}, set()
+        for data in selections.values():
+            for plant in data['carton_plants']:
+                entry = plants.setdefault(plant['id'], {**plant, "customers": []})
+                for customer in plant.get('customers', []):
+                    if customer['id'] not in seen:
+                        seen.add(customer['id'])
+                        entry["customers"].append(customer)
+        return {"paper_plant": first['paper_plant'], "carton_plants": list(plants.values())}
+
+    @staticmethod
+    def _subset(super_solver, data):
+        """Índices de los nodos de `data` dentro de la unión, en el orden en que los numera su solver."""
+        keep = [0]
+        for plant in data['carton_plants']:
+            keep.append(super_solver.id_to_idx[plant['id']])
+            keep.extend(super_solver.id_to_idx[c['id']] for c in plant.get('customers', []))
+        return np.array(keep)
+
+    def run(self, scenarios, output=None):
+        """Ejecuta los escenarios en un pool de procesos y devuelve la tabla comparativa."""
+        selections = self._selections(scenarios)
+        super_solver = LogisticsSolver(self._union(selections))
+        print(f"Escenarios: {len(scenarios)} ({len(selections)} selecciones) sobre una unión de "
+              f"{len(super_solver.nodes)} nodos")
+
+        tasks = []
+        for scenario in scenarios:
+            sub_data = selections[tuple(scenario[k] for k in SELECTION_PARAMS)]
+            keep = self._subset(super_solver, sub_data)
+            tasks.append((scenario, sub_data, super_solver.distance_matrix[np.ix_(keep, keep)], super_solver.is_real_road))
+
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+            rows = list(pool.map(_scenario_worker, *zip(*tasks)))
+
+        self.results = pl.DataFrame(rows)
+        if output is not None:
+            output = Path(output)
+            ensure_dirs(output.parent)
+            if output.suffix == ".parquet":
+                self.results.write_parquet(output)
+            else:
+                self.results.write_csv(output)
+            print(f"📊 Comparativa de escenarios en: {output}")
+        return self.results
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from src.config import DATA_DIR
+    from src.utils.data_manager import DataManager
+
+    parser = argparse.ArgumentParser(description="Barrido what-if de umbral de desvío / clientes por planta.")
+    parser.add_argument("--threshold", type=float, nargs="+", default=[60, 100])
+    parser.add_argument("--customers", type=int, nargs="+", default=[4, 6])
+    parser.add_argument("--time-limit", type=float, nargs="+", default=[10])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=str(RESULTS_DIR / "scenarios.csv"))
+    args = parser.parse_args()
+
+    with open(DATA_DIR / "locations_smurfit.json", 'r', encoding='utf-8') as f:
+        plants_data = json.load(f)
+    dm = DataManager(plants_data['paper_plant'], plants_data['carton_plants'], DATA_DIR / "cliente_ubi.json")
+    grid = scenario_grid(threshold_km=args.threshold, max_customers_per_plant=args.customers, time_limit_s=args.time_limit)
+    print(ScenarioRunner(dm, workers=args.workers).run(grid, output=args.output))
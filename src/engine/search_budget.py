@@ -0,0 +1,134 @@
+import time
+from ortools.constraint_solver import routing_enums_pb2
+from src.config import MAX_SEARCH_TIME, MIN_SEARCH_TIME, SEARCH_TIME_PER_NODE, NO_IMPROVEMENT_FRACTION
+
+# Motivos de parada que informa el solver
+STOP_TIME_LIMIT = "time_limit"
+STOP_SOLUTION_LIMIT = "solution_limit"
+STOP_NO_IMPROVEMENT = "no_improvement"
+STOP_GAP_REACHED = "gap_reached"
+STOP_COMPLETED = "completed"          # Óptimo local sin metaheurística / búsqueda agotada
+STOP_FAILED = "failed"
+
+
+class SearchBudget:
+    """
+    Presupuesto de búsqueda de OR-Tools: límite de tiempo, límite de soluciones,
+    ventana sin mejora (parar tras X s sin bajar el objetivo) y gap objetivo
+    respecto a una cota inferior.
+    """
+
+    def __init__(self, time_limit_s=MAX_SEARCH_TIME, solution_limit=None, no_improvement_s=None,
+                 gap_target=None, lower_bound=None):
+        self.time_limit_s = time_limit_s
+        self.solution_limit = solution_limit
+        self.no_improvement_s = no_improvement_s
+        self.gap_target = gap_target
+        self.lower_bound = lower_bound
+
+    @classmethod
+    def for_nodes(cls, num_nodes, **overrides):
+        """Presupuesto escalado con el tamaño: las instancias diarias pequeñas acaban en segundos."""
+        time_limit = min(MAX_SEARCH_TIME, max(MIN_SEARCH_TIME, SEARCH_TIME_PER_NODE * num_nodes))
+        params = {
+            "time_limit_s": time_limit,
+            "no_improvement_s": max(1.0, time_limit * NO_IMPROVEMENT_FRACTION),
+        }
+        params.update(overrides)
+        return cls(**params)
+
+    def apply(self, search_params):
+        """Vuelca los límites nativos en los RoutingSearchParameters."""
+        seconds = int(self.time_limit_s)
+        search_params.time_limit.seconds = seconds
+        search_params.time_limit.nanos = int((self.time_limit_s - seconds) * 1e9)
+        if self.solution_limit:
+            search_params.solution_limit = self.solution_limit
+
+    def attach(self, routing, lower_bound=None):
+        """
+        Registra el seguimiento del objetivo y los límites personalizados en el modelo.
+        `lower_bound` se usa para el gap si el presupuesto no trae una cota propia.
+        """
+        return BudgetTracker(self, routing, self.lower_bound if self.lower_bound is not None else lower_bound)
+
+    def __repr__(self):
+        return (f"SearchBudget(time_limit_s={self.time_limit_s}, solution_limit={self.solution_limit}, "
+                f"no_improvement_s={self.no_improvement_s}, gap_target={self.gap_target})")
+
+
+class BudgetTracker:
+    """Registra la traza (t, objetivo) de cada solución y decide las paradas anticipadas."""
+
+    def __init__(self, budget, routing, lower_bound=None):
+        self.budget = budget
+        self.routing = routing
+        self.lower_bound = lower_bound
+        self.trace = []
+        self.best = None
+        self.last_improvement = None
+        self.stop_reason = None
+        self.start = None
+        routing.AddAtSolutionCallback(self._on_solution)
+        if budget.no_improvement_s or budget.gap_target is not None:
+            routing.AddSearchMonitor(routing.solver().CustomLimit(self._should_stop))
+
+    def begin(self):
+        self.start = time.perf_counter()
+        self.last_improvement = self.start
+
+    def _on_solution(self):
+        now = time.perf_counter()
+        objective = self.routing.CostVar().Max()
+        self.trace.append((round(now - self.start, 3), objective))
+        if self.best is None or objective < self.best:
+            self.best = objective
+            self.last_improvement = now
+
+    def gap(self):
+        lb = self.lower_bound
+        if self.best is None or not lb:
+            return None
+        return (self.best - lb) / lb
+
+    def _should_stop(self):
+        if self.best is None:
+            return False
+        if self.budget.gap_target is not None:
+            gap = self.gap()
+            if gap is not None and gap <= self.budget.gap_target:
+                self.stop_reason = STOP_GAP_REACHED
+                return True
+        if self.budget.no_improvement_s and time.perf_counter() - self.last_improvement >= self.budget.no_improvement_s:
+            self.stop_reason = STOP_NO_IMPROVEMENT
+            return True
+        return False
+
+    def report(self, status):
+        """Resumen de la ejecución: motivo de parada, tiempo, objetivo y traza."""
+        elapsed = time.perf_counter() - self.start
+        reason = self.stop_reason
+        if reason is None:
+            if status in (routing_enums_pb2.RoutingSearchStatus.ROUTING_FAIL,
+                          routing_enums_pb2.RoutingSearchStatus.ROUTING_INFEASIBLE,
+                          routing_enums_pb2.RoutingSearchStatus.ROUTING_INVALID):
+                reason = STOP_FAILED
+            elif self.budget.solution_limit and len(self.trace) >= self.budget.solution_limit:
+                reason = STOP_SOLUTION_LIMIT
+            elif elapsed >= self.budget.time_limit_s * 0.99 or status == routing_enums_pb2.RoutingSearchStatus.ROUTING_FAIL_TIMEOUT:
+                reason = STOP_TIME_LIMIT
+            else:
+                reason = STOP_COMPLETED
+        return {
+            "stop_reason": reason,
+            "status": routing_enums_pb2.RoutingSearchStatus.Value.Name(status),
+            "wall_time_s": round(elapsed, 3),
+            "objective": self.best,
+            "solutions": len(self.trace),
+            "branches": self.routing.solver().Branches(),
+            "failures": self.routing.solver().Failures(),
+            "lower_bound": self.lower_bound,
+            "gap": self.gap(),
+            "objective_trace": self.trace,
+            "budget": repr(self.budget),
+        }
@@ -1,126 +1,391 @@
 import json
+import time
 import numpy as np
 from ortools.constraint_solver import routing_enums_pb2
 from ortools.constraint_solver import pywrapcp
 from src.utils.geo import GeoUtils
-from src.config import MAX_SEARCH_TIME, DIST_LIMIT
+from src.engine.search_budget import SearchBudget
+from src.engine.candidate_arcs import CandidateArcs
+from src.engine.node_table import NodeTable, CARTON_PLANT, CUSTOMER
+from src.engine.route_kpis import RouteKPIs
+from src.config import DIST_LIMIT, INCREMENTAL_SEARCH_TIME, SPARSE_NEIGHBORS, SPARSE_AUTO_MIN_NODES
+
+DEFAULT_FIRST_SOLUTION = "PARALLEL_CHEAPEST_INSERTION"
+GREEDY_FIRST_SOLUTION = "GREEDY_ROUTES"   # Arranque desde greedy_routes() (por defecto en el modelo disperso)
+DEFAULT_METAHEURISTIC = "GUIDED_LOCAL_SEARCH"
+DROP_PENALTY = 1_000_000   # Coste de dejar un cliente sin servir (disyunción)
+
+
+def _nearest_neighbor_path(d, plant, members):
+    """Planta -> vecino más cercano sucesivo; devuelve (ruta sin depósito, metros con la vuelta)."""
+    left = members
+    route, current, used = [plant], plant, float(d[0, plant])
+    while len(left):
+        j = int(np.argmin(d[current, left]))
+        candidate = int(left[j])
+        left = np.delete(left, j)
+        if used + d[current, candidate] + d[candidate, 0] <= DIST_LIMIT:
+            used += float(d[current, candidate])
+            route.append(candidate)
+            current = candidate
+    return route, used + float(d[current, 0])
+
+
+def _insertion_path(d, plant, members):
+    """Inserción más barata tras la planta, de más lejano a más cercano; (ruta, metros)."""
+    path = [plant, 0]
+    used = float(d[0, plant] + d[plant, 0])
+    for c in members[np.argsort(-d[plant, members], kind="stable")].tolist():
+        a, b = np.asarray(path[:-1]), np.asarray(path[1:])
+        delta = d[a, c] + d[c, b] - d[a, b]
+        j = int(np.argmin(delta))
+        if used + delta[j] <= DIST_LIMIT:
+            path.insert(j + 1, c)
+            used += float(delta[j])
+    return path[:-1], used
+
 
 class LogisticsSolver:
-    def __init__(self, locations_data):
-        self.nodes = self._parse_locations(locations_data)
-        self.geo = GeoUtils()
-        self.distance_matrix, self.is_real_road = self.geo.calculate_distance_matrix(self.nodes)
-
-    def _parse_locations(self, data):
-        """Convierte el JSON de entrada en una lista plana de nodos."""
-        nodes = []
-        # Depósito (Mengíbar) - Nodo 0
-        nodes.append({**data['paper_plant'], "id": "DEPOT", "type": "depot", "matrix_idx": 0})
-        
-        idx = 1
-        # Plantas y sus clientes asociados
-        for plant in data['carton_plants']:
-            plant_id = plant['id']
-            # Nodo de Planta
-            plant_node = {k: v for k, v in plant.items() if k != 'customers'}
-            nodes.append({**plant_node, "type": "carton_plant", "matrix_idx": idx})
-            idx += 1
-            
-            # Nodos de Clientes
-            for customer in plant.get('customers', []):
-                nodes.append({**customer, "type": "customer", "parent_cp": plant_id, "matrix_idx": idx})
-                idx += 1
-        return nodes
-
-    def solve(self):
-        """Ejecuta el optimizador VRP estratégico."""
-        plant_indices = [i for i, n in enumerate(self.nodes) if n['type'] == 'carton_plant']
-        customer_indices = [i for i, n in enumerate(self.nodes) if n['type'] == 'customer']
-        
-        # Validar que tenemos datos
-        if not plant_indices:
-            print("⚠️ Error: No se detectaron plantas de cartón válidas.")
-            return None
+    def __init__(self, locations_data, distance_matrix=None, is_real_road=False, sparse_k=None):
+        """
+        `distance_matrix` permite reutilizar una matriz ya calculada (portfolio,
+        escenarios...) sin volver a pasar por GeoUtils. `sparse_k` activa el modelo de
+        arcos candidatos (k vecinos más cercanos); por defecto se activa solo en
+        instancias de SPARSE_AUTO_MIN_NODES nodos o más.
+        """
+        self.locations_data = locations_data
+        # Tabla compacta (struct-of-arrays); self.nodes[i] devuelve la vista dict del nodo
+        self.nodes = NodeTable.from_locations(locations_data)
+        self._build_index_maps()
+        self.last_run = None
+        self.last_routes = None   # Rutas (arrays de índices) de la última solución
+        self._kpis = None
+        if distance_matrix is None:
+            self.geo = GeoUtils()
+            self.distance_matrix, self.is_real_road = self.geo.calculate_distance_matrix(self.nodes)
+        else:
+            self.distance_matrix, self.is_real_road = distance_matrix, is_real_road
+        if sparse_k is None and len(self.nodes) >= SPARSE_AUTO_MIN_NODES:
+            sparse_k = SPARSE_NEIGHBORS
+        self.sparse_k = sparse_k
+        self.candidates = None
 
-        dist_matrix = self.distance_matrix.astype(int).tolist()
-        num_vehicles = len(plant_indices)
-        depot_idx = 0
+    def _build_index_maps(self):
+        """Mapas id -> índice y vectores por nodo, calculados una sola vez sobre la tabla compacta."""
+        table = self.nodes
+        self.id_to_idx = {node_id: i for i, node_id in enumerate(table.ids)}
+        self.plant_indices = table.indices_of(CARTON_PLANT).tolist()
+        self.customer_indices = table.indices_of(CUSTOMER).tolist()
+        self.parent_idx = {c: int(table.parent[c]) for c in self.customer_indices}
+        self.plant_vector = (table.type_code == CARTON_PLANT).astype(int).tolist()
+        self.plant_vehicle = {p: v for v, p in enumerate(self.plant_indices)}   # Vehículo fijo de cada planta
 
-        manager = pywrapcp.RoutingIndexManager(len(dist_matrix), num_vehicles, depot_idx)
+    def _build_model(self, native_transits=True, seed_routes=None):
+        """
+        Construye el modelo de OR-Tools. Con `native_transits` la matriz y el contador de
+        plantas se registran como datos (RegisterTransitMatrix / RegisterUnaryTransitVector)
+        y la búsqueda nunca vuelve a Python; el modo con callbacks se conserva para el benchmark.
+        El modelo disperso también es nativo: los arcos no candidatos se prohíben reduciendo
+        el dominio de cada NextVar (_restrict_neighborhoods) y en la matriz de tránsito valen
+        DIST_LIMIT + 1. Sigue habiendo matrices densas (la float de GeoUtils en
+        `self.distance_matrix` y la int64 que OR-Tools copia en C++); lo que se ahorra es
+        la lista intermedia con un entero Python por celda. Los arcos de `seed_routes`
+        (solución inicial, por vehículo) se añaden a los candidatos.
+        """
+        num_vehicles = len(self.plant_indices)
+        depot_idx = 0
+        manager = pywrapcp.RoutingIndexManager(len(self.nodes), num_vehicles, depot_idx)
         routing = pywrapcp.RoutingModel(manager)
 
         # --- DIMENSIONES ---
-        def distance_callback(from_index, to_index):
-            from_node = manager.IndexToNode(from_index)
-            to_node = manager.IndexToNode(to_index)
-            return int(dist_matrix[from_node][to_node])
+        if self.sparse_k and native_transits:
+            seed_arcs = None
+            if seed_routes:
+                seed_arcs = (np.concatenate([route[:-1] for route in seed_routes if route] or [[]]),
+                             np.concatenate([route[1:] for route in seed_routes if route] or [[]]))
+            self.candidates = CandidateArcs.build(self.distance_matrix, self.sparse_k, self.plant_indices,
+                                                  self.parent_idx, extra_arcs=seed_arcs)
+            # Los arcos no candidatos superan la capacidad de la dimensión: quedan prohibidos
+            dist_matrix = self.candidates.transit_matrix(self.distance_matrix, DIST_LIMIT + 1)
+            transit_callback_index = routing.RegisterTransitMatrix(dist_matrix)
+            del dist_matrix
+            plant_cb_idx = routing.RegisterUnaryTransitVector(self.plant_vector)
+        elif native_transits:
+            dist_matrix = self.distance_matrix.astype(int).tolist()
+            transit_callback_index = routing.RegisterTransitMatrix(dist_matrix)
+            plant_cb_idx = routing.RegisterUnaryTransitVector(self.plant_vector)
+        else:
+            dist_matrix = self.distance_matrix.astype(int).tolist()
+
+            def distance_callback(from_index, to_index):
+                return dist_matrix[manager.IndexToNode(from_index)][manager.IndexToNode(to_index)]
+
+            def plant_callback(from_index):
+                return self.plant_vector[manager.IndexToNode(from_index)]
+
+            transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+            plant_cb_idx = routing.RegisterUnaryTransitCallback(plant_callback)
 
-        transit_callback_index = routing.RegisterTransitCallback(distance_callback)
         routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
         routing.AddDimension(transit_callback_index, 0, DIST_LIMIT, True, 'Distance')
-        dist_dim = routing.GetDimensionOrDie('Distance')
-        # 2. Plantas (Contador por vehículo)
-        def plant_callback(from_index):
-            node_idx = manager.IndexToNode(from_index)
-            return 1 if self.nodes[node_idx]['type'] == 'carton_plant' else 0
-        
-        plant_cb_idx = routing.RegisterUnaryTransitCallback(plant_callback)
+        # 2. Plantas (Contador por vehículo): como mucho una por camión
         routing.AddDimension(plant_cb_idx, 0, 1, True, 'PlantCount')
-        plant_dim = routing.GetDimensionOrDie('PlantCount')
 
         # --- RESTRICCIONES ESTRATÉGICAS ---
-        # 1. Cada camión debe visitar exactamente 1 planta
-        for v in range(num_vehicles):
-            routing.solver().Add(plant_dim.CumulVar(routing.End(v)) == 1)
+        # Cada camión sale del depósito a exactamente 1 planta y sus clientes van en ese
+        # camión, tras la planta. Los camiones son idénticos, así que la planta k se fija
+        # al vehículo k (rompe la simetría) y todo queda como dominios de variables: la
+        # salida del vehículo k es su planta (obligatoria, y precedencia implícita) y cada
+        # cliente solo admite el vehículo de su planta. Las heurísticas de inserción
+        # entienden estos dominios de forma nativa, a diferencia de las restricciones
+        # sobre VehicleVar/CumulVar, que solo se detectaban por propagación.
+        for v, p_idx in enumerate(self.plant_indices):
+            routing.NextVar(routing.Start(v)).SetValue(manager.NodeToIndex(p_idx))
 
-        # 2. Todas las plantas obligatorias
-        for p_idx in plant_indices:
-            p_node = manager.NodeToIndex(p_idx)
-            routing.solver().Add(routing.ActiveVar(p_node) == 1)
-
-        # 3. Clientes vinculados a su planta
-        for c_idx in customer_indices:
+        # Clientes vinculados a su planta (opcionales, con penalización por no servirlos)
+        for c_idx in self.customer_indices:
             c_node = manager.NodeToIndex(c_idx)
-            routing.AddDisjunction([c_node], 1_000_000)
-            
-            node = self.nodes[c_idx]
-            parent_id = node.get('parent_cp')
-            p_idx = next((i for i, n in enumerate(self.nodes) if n['id'] == parent_id), None)
-            
-            if p_idx is not None:
-                p_node = manager.NodeToIndex(p_idx)
-                # Link estratégico: Mismo vehículo
-                routing.solver().Add(
-                    routing.ActiveVar(c_node) * (routing.VehicleVar(c_node) - routing.VehicleVar(p_node)) == 0
-                )
-                # Precedencia
-                routing.solver().Add(dist_dim.CumulVar(p_node) < dist_dim.CumulVar(c_node))
+            routing.AddDisjunction([c_node], DROP_PENALTY)
+            # Vehículo de su planta o -1 (no servido)
+            routing.VehicleVar(c_node).SetValues([-1, self.plant_vehicle[self.parent_idx[c_idx]]])
+
+        if self.candidates is not None and native_transits:
+            self._restrict_neighborhoods(manager, routing)
+
+        return manager, routing
+
+    def _restrict_neighborhoods(self, manager, routing):
+        """
+        Reduce el dominio de cada NextVar a sus arcos candidatos (más los finales de ruta y el
+        propio nodo, que representa 'no visitado'); los operadores de búsqueda local
+        descartan así los movimientos fuera del grafo disperso sin evaluarlos.
+        """
+        ends = [routing.End(v) for v in range(routing.vehicles())]
+        # Las salidas del depósito ya están fijadas a su planta en _build_model
+        for node in range(1, len(self.nodes)):
+            cols = [int(c) for c in self.candidates.neighbors(node) if c != 0]
+            index = manager.NodeToIndex(node)
+            routing.NextVar(index).SetValues([manager.NodeToIndex(c) for c in cols] + ends + [index])
+
+    def lower_bound(self):
+        """
+        Cota inferior estructural del objetivo: cada planta se visita en una ruta distinta
+        que sale y vuelve al depósito, así que (con distancias métricas) cuesta al menos
+        d(D,P) + d(P,D). ComputeLowerBound de OR-Tools no admite disyunciones.
+        """
+        plants = self.plant_indices
+        d = self.distance_matrix
+        return int(d[0, plants].astype(int).sum() + d[plants, 0].astype(int).sum())
+
+    def solve(self, budget=None, first_solution_strategy=None,
+              metaheuristic=DEFAULT_METAHEURISTIC, seed=None, initial_routes=None, as_indices=False,
+              route_sink=None):
+        """
+        Ejecuta el optimizador VRP estratégico.
+        `budget` (SearchBudget) fija los criterios de parada; por defecto se escala con el
+        número de nodos. Estrategia inicial y metaheurística se indican por nombre del enum
+        de OR-Tools, o GREEDY_FIRST_SOLUTION para arrancar de greedy_routes(). Sin estrategia
+        se usa GREEDY_FIRST_SOLUTION en el modelo disperso (`sparse_k`), donde las
+        inserciones de OR-Tools apenas encuentran huecos en un grafo de k vecinos, y
+        DEFAULT_FIRST_SOLUTION en el denso; una estrategia explícita siempre se respeta.
+        `initial_routes` (rutas previas, de dicts, ids o índices) arranca la búsqueda desde
+        esa solución. El resumen de la ejecución queda en `self.last_run`.
+        Con `as_indices` devuelve las rutas como arrays int32 de índices de nodo (sin
+        construir diccionarios); por defecto, como listas de dicts para exportar.
+        `route_sink` (p.ej. un RouteWriter) recibe cada ruta en cuanto se extrae.
+        """
+        # Validar que tenemos datos
+        if not self.plant_indices:
+            print("⚠️ Error: No se detectaron plantas de cartón válidas.")
+            return None
+
+        build_start = time.perf_counter()
+        if first_solution_strategy is None:
+            first_solution_strategy = GREEDY_FIRST_SOLUTION if self.sparse_k else DEFAULT_FIRST_SOLUTION
+        vehicle_routes = self._vehicle_routes(initial_routes) if initial_routes else None
+        if vehicle_routes is None and first_solution_strategy == GREEDY_FIRST_SOLUTION:
+            vehicle_routes = self.greedy_routes()
+        if first_solution_strategy == GREEDY_FIRST_SOLUTION:
+            # Estrategia de OR-Tools solo si la solución voraz no es compatible con el modelo
+            first_solution_strategy = DEFAULT_FIRST_SOLUTION
+        manager, routing = self._build_model(seed_routes=vehicle_routes)
+        budget = budget or SearchBudget.for_nodes(len(self.nodes))
+        tracker = budget.attach(routing, lower_bound=self.lower_bound() if budget.gap_target is not None else None)
 
         # --- BÚSQUEDA ---
         search_params = pywrapcp.DefaultRoutingSearchParameters()
-        search_params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION
-        search_params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
-        search_params.time_limit.seconds = 90
+        search_params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.Value.Value(first_solution_strategy)
+        search_params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.Value.Value(metaheuristic)
+        budget.apply(search_params)
+        routing.CloseModelWithParameters(search_params)
+        if seed is not None:
+            routing.solver().ReSeed(seed)
 
-        print(f"Iniciando optimización FINAL ({num_vehicles} vehículos)...")
-        solution = routing.SolveWithParameters(search_params)
+        print(f"Iniciando optimización FINAL ({routing.vehicles()} vehículos, {budget})...")
+        model_build_s = time.perf_counter() - build_start
+        tracker.begin()
+        initial = self._read_initial_assignment(manager, routing, vehicle_routes) if vehicle_routes else None
+        if initial is not None:
+            solution = routing.SolveFromAssignmentWithParameters(initial, search_params)
+        else:
+            solution = routing.SolveWithParameters(search_params)
+        self.last_run = tracker.report(routing.status())
+        self.last_run["model_build_s"] = round(model_build_s, 3)
+        print(f"Búsqueda detenida por '{self.last_run['stop_reason']}' tras {self.last_run['wall_time_s']} s "
+              f"({self.last_run['solutions']} soluciones).")
         if solution:
-            return self._extract_routes(manager, routing, solution)
+            extract_start = time.perf_counter()
+            routes = self._extract_routes(manager, routing, solution, route_sink)
+            self.last_run["route_extraction_s"] = round(time.perf_counter() - extract_start, 4)
+            self.record_solution(routes)
+            return routes if as_indices else self.nodes.to_routes(routes)
+        self.last_routes, self._kpis = None, None
         return None
 
-    def _extract_routes(self, manager, routing, solution):
+    def routes_to_indices(self, routes):
+        """
+        Convierte rutas (listas de nodos, de ids o de índices de nodo, con o sin depósito)
+        en listas de índices de nodo sin depósito. Los ids que ya no existen se descartan.
+        Los enteros se toman como índices de este solver (sin pasar por el id).
+        """
+        index_routes = []
+        for route in routes:
+            idx = []
+            for n in route:
+                if isinstance(n, (int, np.integer)):
+                    i = int(n)
+                else:
+                    i = self.id_to_idx.get(n['id'] if isinstance(n, dict) else n)
+                if i is not None and i != 0:
+                    idx.append(i)
+            if idx:
+                index_routes.append(idx)
+        return index_routes
+
+    def _vehicle_routes(self, routes):
+        """
+        Rutas previas (dicts, ids o índices) colocadas en el vehículo fijo de su planta,
+        con la planta al frente y sin clientes de otra planta (el modelo no los admite).
+        Los vehículos sin ruta previa quedan con solo su planta.
+        """
+        slots = [[p] for p in self.plant_indices]
+        for route in self.routes_to_indices(routes):
+            plants = [i for i in route if self.plant_vector[i]]
+            if len(plants) != 1:
+                continue
+            p = plants[0]
+            slots[self.plant_vehicle[p]] = [p] + [i for i in route if self.parent_idx.get(i) == p]
+        return slots
+
+    def greedy_routes(self):
+        """
+        Solución inicial por vehículo en O(F²) por familia (filas de la matriz, sin
+        OR-Tools): para cada planta se construyen una ruta de vecino más cercano y una de
+        inserción más barata (clientes de más lejano a más cercano) y se queda la de menor
+        coste en el modelo (metros + DROP_PENALTY por cliente sin servir). Los clientes
+        que harían superar DIST_LIMIT con la vuelta al depósito quedan sin servir.
+        """
+        family = {p: [] for p in self.plant_indices}
+        for c, p in self.parent_idx.items():
+            family[p].append(c)
+        routes = []
+        for p in self.plant_indices:
+            members = np.asarray(family[p], dtype=np.int64)
+            options = [_nearest_neighbor_path(self.distance_matrix, p, members),
+                       _insertion_path(self.distance_matrix, p, members)]
+            best = min(options, key=lambda o: o[1] + DROP_PENALTY * (len(members) + 1 - len(o[0])))
+            routes.append(best[0])
+        return routes
+
+    def _read_initial_assignment(self, manager, routing, vehicle_routes):
+        """Asignación inicial para OR-Tools a partir de rutas por vehículo (None si no es válida)."""
+        var_routes = [[manager.NodeToIndex(i) for i in route] for route in vehicle_routes]
+        assignment = routing.ReadAssignmentFromRoutes(var_routes, True)
+        if assignment is None:
+            print("AVISO: las rutas previas no son compatibles con el modelo; se resuelve desde cero.")
+        return assignment
+
+    def resolve_incremental(self, previous_routes, budget=None, route_sink=None):
+        """
+        Re-optimización incremental frente a la solución de ayer: elimina los nodos que
+        ya no existen, saca de su ruta a los clientes que ahora cuelgan de otra planta,
+        inserta los clientes nuevos o reasignados en la ruta de su planta (tras ella) en
+        la posición más barata y lanza una fase corta de mejora desde esa solución.
+        """
+        d = self.distance_matrix
+        routes = self.routes_to_indices(previous_routes)
+        # Una planta por ruta: descartar rutas cuya planta ya no existe
+        routes = [r for r in routes if sum(self.plant_vector[i] for i in r) == 1]
+        route_of_plant = {i: r for r in routes for i in r if self.plant_vector[i]}
+        # El modelo exige el camión de la planta padre: los clientes que cambiaron de
+        # planta salen de su ruta y se reinsertan como si fueran nuevos
+        moved = 0
+        for p_idx, route in route_of_plant.items():
+            keep = [i for i in route if i == p_idx or self.parent_idx.get(i) == p_idx]
+            moved += len(route) - len(keep)
+            route[:] = keep
+        served = {i for r in routes for i in r}
+
+        for p_idx in self.plant_indices:
+            if p_idx not in route_of_plant:
+                route_of_plant[p_idx] = [p_idx]
+                routes.append(route_of_plant[p_idx])
+
+        added = [c for c in self.customer_indices if c not in served]
+        for c_idx in added:
+            p_idx = self.parent_idx[c_idx]
+            route = route_of_plant.get(p_idx)
+            if route is None:
+                continue
+            # Inserción más barata en cualquier posición posterior a la planta
+            path = [0] + route + [0]
+            start = path.index(p_idx)
+            best_pos, best_delta = None, None
+            for pos in range(start, len(path) - 1):
+                a, b = path[pos], path[pos + 1]
+                delta = d[a, c_idx] + d[c_idx, b] - d[a, b]
+                if best_delta is None or delta < best_delta:
+                    best_pos, best_delta = pos, delta
+            route.insert(best_pos, c_idx)   # Insertar tras path[pos] equivale a la posición pos de route
+
+        previous_ids = {n['id'] if isinstance(n, dict) else n for route in previous_routes for n in route
+                        if not isinstance(n, (int, np.integer))}
+        dropped = [i for i in previous_ids if i not in self.id_to_idx]
+        print(f"Re-optimización incremental: {len(added)} clientes sin ruta previa ({moved} cambiaron de planta), "
+              f"{len(dropped)} nodos eliminados.")
+        budget = budget or SearchBudget.for_nodes(len(self.nodes), time_limit_s=INCREMENTAL_SEARCH_TIME,
+                                                  no_improvement_s=INCREMENTAL_SEARCH_TIME / 4)
+        return self.solve(budget=budget, initial_routes=routes, route_sink=route_sink)
+
+    def record_solution(self, index_routes):
+        """Fija la solución vigente (rutas de índices); sus KPIs se recalculan bajo demanda."""
+        self.last_routes = [np.asarray(route, dtype=np.int32) for route in index_routes]
+        self._kpis = None
+
+    @property
+    def kpis(self):
+        """
+        KPIs (RouteKPIs) de la última solución (sin rutas si no la hay), calculados una
+        vez y compartidos por todos los informes.
+        """
+        if self._kpis is None:
+            self._kpis = RouteKPIs(self.last_routes or [], self.nodes.type_code, self.distance_matrix)
+        return self._kpis
+
+    def _extract_routes(self, manager, routing, solution, sink=None):
+        """Rutas de la solución como arrays int32 de índices de nodo (depósito incluido)."""
         all_routes = []
         for vehicle_id in range(routing.vehicles()):
             index = routing.Start(vehicle_id)
             route = []
             while not routing.IsEnd(index):
-                node_idx = manager.IndexToNode(index)
-                route.append(self.nodes[node_idx])
+                route.append(manager.IndexToNode(index))
                 index = solution.Value(routing.NextVar(index))
             # Añadir el nodo final (Depósito)
-            node_idx = manager.IndexToNode(index)
-            route.append(self.nodes[node_idx])
+            route.append(manager.IndexToNode(index))
             
             if len(route) > 2:
-                all_routes.append(route)
+                all_routes.append(np.array(route, dtype=np.int32))
+                if sink is not None:
+                    sink.write_route(all_routes[-1])
         return all_routes
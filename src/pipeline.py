@@ -0,0 +1,133 @@
+"""
+Pipeline sin interfaz gráfica: selección de clientes + resolución + exportación de rutas.
+
+No importa nada de la pila de visualización (folium, plotly, networkx...), así que un
+trabajo por lotes arranca en una fracción del tiempo de main.py.
+
+Uso:
+    python -m src.pipeline
+    python -m src.pipeline --customers 6 --threshold 150 --time-limit 20 --warm-start
+"""
+import argparse
+import json
+from contextlib import nullcontext
+from pathlib import Path
+from src.config import DATA_DIR, RESULTS_DIR, LOGS_DIR, WARM_START, ensure_dirs
+from src.utils.profiling import metrics
+
+PLANTS_FILE = DATA_DIR / "locations_smurfit.json"
+CLIENTS_FILE = DATA_DIR / "cliente_ubi.json"
+ROUTES_FILE = RESULTS_DIR / "optimized_routes.ndjson"
+
+
+def solve_routes(max_customers_per_plant=4, threshold_km=100, output=ROUTES_FILE, warm_start=WARM_START,
+                 budget=None, plants_file=PLANTS_FILE, clients_file=CLIENTS_FILE):
+    """
+    Ejecuta selección + matriz + búsqueda y guarda las rutas en `output`: export compacto
+    (.ndjson en streaming, .parquet o .arrow; ver route_export) o, con .json, la lista
+    completa de nodos del formato antiguo. Si `warm_start` y `output` ya existe,
+    re-optimiza de forma incremental sobre ella.
+    Devuelve (solver, rutas); rutas es None si no se encontró solución.
+    """
+    from src.engine.solver import LogisticsSolver
+    from src.utils.data_manager import DataManager
+    from src.utils.route_export import RouteWriter, read_routes
+
+    if not Path(plants_file).exists() or not Path(clients_file).exists():
+        print(f"❌ Error: Faltan archivos de datos en {DATA_DIR}")
+        return None, None
+
+    with open(plants_file, 'r', encoding='utf-8') as f:
+        plants_data = json.load(f)
+
+    # Selección inteligente de clientes (filtro de retorno)
+    dm = DataManager(
+        paper_plant=plants_data['paper_plant'],
+        carton_plants=plants_data['carton_plants'],
+        clients_file=clients_file
+    )
+    with metrics.stage("load_clients"):
+        dm.load_clients()
+    with metrics.stage("corridor_filter"):
+        enriched_data = dm.get_optimized_locations(max_customers_per_plant=max_customers_per_plant,
+                                                   threshold_km=threshold_km)
+
+    with metrics.stage("matrix_build"):
+        solver = LogisticsSolver(enriched_data)
+    metrics.set("distance_matrix.source", "road" if solver.is_real_road else "haversine")
+    metrics.set("nodes", len(solver.nodes))
+
+    print(f"\nEngine Status: {'GPS Real' if solver.is_real_road else 'Haversine Matrix'}")
+    print(f"Nodos totales a optimizar: {len(solver.nodes)}")
+
+    output = Path(output)
+    legacy_json = output.suffix == ".json"
+    previous_routes = None
+    if warm_start and output.exists():
+        if legacy_json:
+            with open(output, 'r', encoding='utf-8') as f:
+                previous_routes = json.load(f)
+        else:
+            # Las rutas previas se referencian por id (los índices cambian entre ejecuciones)
+            table, index_routes, _ = read_routes(output)
+            previous_routes = [[table.ids[i] for i in route] for route in index_routes]
+
+    # Export compacto en streaming: cada ruta se escribe al extraerla de la solución
+    sink = None if legacy_json else RouteWriter(output, solver.nodes, solver.distance_matrix)
+    with metrics.stage("solve"), (sink or nullcontext()):
+        if previous_routes is not None:
+            routes = solver.resolve_incremental(previous_routes, budget=budget, route_sink=sink)
+        else:
+            routes = solver.solve(budget=budget, route_sink=sink)
+    metrics.record_solver(solver.last_run)
+    if routes:
+        for name, value in solver.kpis.summary().items():
+            metrics.set(f"kpi.{name}", value)
+
+    if routes and legacy_json:
+        with metrics.stage("export_json"):
+            ensure_dirs(output.parent)
+            with open(output, 'w', encoding='utf-8') as f:
+                json.dump(routes, f, indent=2, ensure_ascii=False)
+    return solver, routes
+
+
+def add_warm_start_flags(parser):
+    """--warm-start / --no-warm-start explícitos; sin ninguno se usa WARM_START."""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--warm-start", dest="warm_start", action="store_true",
+                       help="re-optimizar sobre la solución anterior si existe")
+    group.add_argument("--no-warm-start", dest="warm_start", action="store_false",
+                       help="resolver desde cero aunque exista una solución anterior")
+    parser.set_defaults(warm_start=WARM_START)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=4, help="max_customers_per_plant")
+    parser.add_argument("--threshold", type=float, default=100, help="desvío máximo (km)")
+    parser.add_argument("--time-limit", type=float, help="límite de búsqueda en segundos (por defecto escala con los nodos)")
+    parser.add_argument("--output", type=Path, default=ROUTES_FILE)
+    add_warm_start_flags(parser)
+    args = parser.parse_args()
+
+    budget = None
+    if args.time_limit is not None:
+        from src.engine.search_budget import SearchBudget
+        budget = SearchBudget(time_limit_s=args.time_limit)
+
+    metrics.reset("headless")
+    with metrics.run():
+        solver, routes = solve_routes(args.customers, args.threshold, args.output,
+                                      warm_start=args.warm_start, budget=budget)
+    metrics.write_json(RESULTS_DIR / "run_metrics_headless.json")
+    metrics.write_openmetrics(LOGS_DIR / "run_metrics_headless.prom")
+    if routes:
+        print(f"\n✅ {len(routes)} rutas guardadas en: {args.output}")
+    else:
+        print("\n❌ FALLO: El optimizador no pudo encontrar una solución válida con las restricciones actuales.")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Servicio de optimización residente (HTTP local) con cachés en caliente.
+
+El proceso mantiene en memoria la tabla de clientes, el índice espacial y de pasillo
+(DataManager), la caché de distancias (GeoUtils) y el geocoder postal. Cada trabajo
+solo paga la selección y la matriz (en caliente, milisegundos) en un hilo de preparación
+que alimenta un pool de procesos para la búsqueda, de modo que la latencia queda dominada
+por el presupuesto de búsqueda y los hilos HTTP nunca esperan a la preparación.
+Los trabajos terminados se conservan SERVICE_JOB_TTL_S segundos (y como mucho
+SERVICE_MAX_JOBS en memoria).
+
+Endpoints:
+    POST /optimize          un trabajo JSON; espera y devuelve rutas + KPIs
+    POST /jobs              uno o varios trabajos (JSON o NDJSON, una línea por trabajo);
+                            devuelve sus ids sin esperar
+    GET  /jobs/<id>         estado y resultado de un trabajo
+    GET  /geocode?postcode=23440&country=ES[&municipality=...]
+    GET  /health            estado del servicio y tamaño de las cachés
+
+Campos de un trabajo (todos opcionales): request_id, max_customers_per_plant,
+threshold_km, assignment, time_limit_s, no_improvement_s, solution_limit,
+first_solution_strategy, metaheuristic, seed.
+
+Uso:
+    python -m src.service --port 8780 --workers 2
+    curl -s -X POST localhost:8780/optimize -d '{"threshold_km": 150, "time_limit_s": 10}'
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from src.config import (DATA_DIR, SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS, SERVICE_JOB_TTL_S,
+                        SERVICE_MAX_JOBS)
+from src.engine.node_table import NodeTable
+from src.engine.search_budget import SearchBudget
+from src.engine.solver import LogisticsSolver, DEFAULT_METAHEURISTIC
+from src.utils.data_manager import DataManager
+from src.utils.geo import GeoUtils
+
+SELECTION_DEFAULTS = {"max_customers_per_plant": 4, "threshold_km": 100}
+BUDGET_FIELDS = ("time_limit_s", "no_improvement_s", "solution_limit")
+
+
+def _solve_job(job, locations_data, matrix, is_real_road):
+    """Resuelve un trabajo en un proceso del pool (la matriz llega ya calculada)."""
+    solver = LogisticsSolver(locations_data, distance_matrix=matrix, is_real_road=is_real_road)
+    budget = SearchBudget.for_nodes(len(solver.nodes), **{k: job[k] for k in BUDGET_FIELDS if k in job})
+    start = time.perf_counter()
+    routes = solver.solve(
+        budget=budget,
+        first_solution_strategy=job.get("first_solution_strategy"),
+        metaheuristic=job.get("metaheuristic", DEFAULT_METAHEURISTIC),
+        seed=job.get("seed"),
+        as_indices=True,
+    ) or []
+    solve_s = time.perf_counter() - start
+
+    table = solver.nodes
+    kpis = solver.kpis
+    run = {k: v for k, v in (solver.last_run or {}).items() if k != "objective_trace"}
+    return {
+        "routes": [
+            {"plant": table.ids[route[1]], "km": round(float(km) / 1000, 2),
+             "empty_return_km": round(float(empty) / 1000, 2), "utilisation": round(float(use), 4),
+             "stops": [{"id": table.ids[i], "name": table.names[i],
+                        "lat": float(table.lat[i]), "lng": float(table.lng[i])} for i in route]}
+            for route, km, empty, use in zip(routes, kpis.route_m, kpis.empty_return_m, kpis.utilisation)
+        ],
+        "kpis": {
+            "nodes": len(table),
+            **kpis.summary(),
+            "customers_selected": len(solver.customer_indices),
+            "objective": run.get("objective"),
+            "stop_reason": run.get("stop_reason"),
+            "solve_s": round(solve_s, 3),
+            "worker_pid": os.getpid(),
+        },
+    }
+
+
+class OptimizationService:
+    """
+    Estado en caliente + cola de trabajos en dos etapas. La preparación (selección y
+    matriz) corre en un único hilo y se serializa además con un lock porque DataManager
+    y la caché SQLite no son seguros entre hilos; la búsqueda corre en paralelo en
+    `workers` procesos. `submit` solo registra el trabajo y devuelve su id.
+    """
+
+    def __init__(self, workers=SERVICE_WORKERS, plants_file=DATA_DIR / "locations_smurfit.json",
+                 clients_file=DATA_DIR / "cliente_ubi.json", job_ttl_s=SERVICE_JOB_TTL_S,
+                 max_jobs=SERVICE_MAX_JOBS):
+        start = time.perf_counter()
+        with open(plants_file, 'r', encoding='utf-8') as f:
+            plants = json.load(f)
+        self.dm = DataManager(plants['paper_plant'], plants['carton_plants'], clients_file)
+        self.dm.load_clients()
+        self.dm.build_corridor_index()
+        self.geo = GeoUtils()
+        self.geocoder = None
+        self._geocoder_loaded = False
+        self.prepare_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prepare")
+        # spawn: no heredar por fork el estado de un proceso con hilos y la conexión SQLite abierta
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        self.workers = workers
+        self.jobs = {}
+        self.job_ttl_s = job_ttl_s
+        self.max_jobs = max_jobs
+        self._ids = itertools.count(1)
+        self._setup_lock = threading.Lock()
+        self._jobs_lock = threading.Lock()
+        self._geocoder_lock = threading.Lock()
+        self.started_at = time.time()
+        self.warmup_s = round(time.perf_counter() - start, 3)
+        print(f"🛰️ Servicio listo en {self.warmup_s}s: {self.dm.load_clients().height} clientes, {workers} workers")
+
+    def _prepare(self, job):
+        """Selección de clientes y matriz de distancias con las cachés en caliente."""
+        selection = {k: job.get(k, v) for k, v in SELECTION_DEFAULTS.items()}
+        if "assignment" in job:
+            selection["assignment"] = job["assignment"]
+        with self._setup_lock:
+            data = self.dm.get_optimized_locations(**selection)
+            matrix, is_road = self.geo.calculate_distance_matrix(NodeTable.from_locations(data))
+        return data, matrix, bool(is_road)
+
+    def submit(self, job):
+        """Encola un trabajo y devuelve su id (request_id si viene en el trabajo) sin esperar."""
+        with self._jobs_lock:
+            self._evict()
+            job_id = str(job.get("request_id") or f"job-{next(self._ids)}")
+            if job_id in self.jobs:
+                job_id = f"{job_id}-{next(self._ids)}"
+            entry = {"id": job_id, "status": "preparing", "submitted_at": time.time(), "job": job,
+                     "event": threading.Event()}
+            self.jobs[job_id] = entry
+        self.prepare_pool.submit(self._run, entry)
+        return job_id
+
+    def _run(self, entry):
+        """Etapa de preparación (hilo propio): selección + matriz y envío al pool de búsqueda."""
+        start = time.perf_counter()
+        try:
+            data, matrix, is_road = self._prepare(entry["job"])
+            self._update(entry, setup_s=round(time.perf_counter() - start, 4), status="queued")
+            queued_at = time.perf_counter()
+            future = self.pool.submit(_solve_job, entry["job"], data, matrix, is_road)
+        except Exception as e:
+            self._finish(entry, status="failed", error=str(e))
+            return
+
+        def done(f):
+            latency_s = round(entry["setup_s"] + time.perf_counter() - queued_at, 3)
+            if f.exception() is not None:
+                self._finish(entry, status="failed", error=str(f.exception()), latency_s=latency_s)
+            else:
+                self._finish(entry, status="done", latency_s=latency_s, **f.result())
+
+        future.add_done_callback(done)
+
+    def _update(self, entry, **fields):
+        # Los callbacks del pool y los hilos HTTP (result, health) comparten las entradas
+        with self._jobs_lock:
+            entry.update(**fields)
+
+    def _finish(self, entry, **fields):
+        self._update(entry, finished_at=time.time(), **fields)
+        entry["event"].set()
+
+    def _evict(self):
+        """Olvida los trabajos terminados que superan el TTL o el máximo en memoria (con _jobs_lock)."""
+        now = time.time()
+        finished = sorted((e for e in self.jobs.values() if "finished_at" in e), key=lambda e: e["finished_at"])
+        excess = len(self.jobs) - self.max_jobs + 1
+        for i, entry in enumerate(finished):
+            if i < excess or now - entry["finished_at"] > self.job_ttl_s:
+                del self.jobs[entry["id"]]
+
+    def result(self, job_id, wait=False, timeout=None):
+        with self._jobs_lock:
+            entry = self.jobs.get(job_id)
+        if entry is None:
+            return None
+        if wait:
+            entry["event"].wait(timeout)
+        with self._jobs_lock:
+            return {k: v for k, v in entry.items() if k != "event"}
+
+    def geocode(self, postcode, country=None, municipality=None):
+        with self._geocoder_lock:
+            if not self._geocoder_loaded:
+                from src.utils.geocoder import PostalGeocoder
+                try:
+                    self.geocoder = PostalGeocoder()
+                except FileNotFoundError as e:
+                    print(f"AVISO: geocoder no disponible ({e})")
+                self._geocoder_loaded = True
+        if self.geocoder is None:
+            return None
+        with self._setup_lock:
+            frame = self.geocoder.geocode([postcode], [municipality] if municipality else None,
+                                          [country] if country else None)
+        return frame.to_dicts()[0]
+
+    def health(self):
+        with self._jobs_lock:
+            counts = {}
+            for entry in self.jobs.values():
+                counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return {
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "warmup_s": self.warmup_s,
+            "clients": self.dm.load_clients().height,
+            "workers": self.workers,
+            "jobs": counts,
+            "geocoder_loaded": self.geocoder is not None,
+        }
+
+    def shutdown(self):
+        self.prepare_pool.shutdown(wait=False, cancel_futures=True)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _parse_jobs(body):
+    """Un objeto JSON, una lista de objetos o NDJSON (una línea por trabajo); ValueError si no."""
+    text = body.decode('utf-8').strip()
+    if not text:
+        return [{}]
+    try:
+        parsed = json.loads(text)
+        jobs = parsed if isinstance(parsed, list) else [parsed]
+    except json.JSONDecodeError:
+        jobs = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if not jobs:
+        raise ValueError("no hay ningún trabajo")
+    if not all(isinstance(job, dict) for job in jobs):
+        raise ValueError("cada trabajo debe ser un objeto JSON")
+    return jobs
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/health":
+            self._send(200, self.service.health())
+        elif url.path.startswith("/jobs/"):
+            result = self.service.result(url.path[len("/jobs/"):], wait=params.get("wait") == "1")
+            self._send(200 if result else 404, result or {"error": "trabajo no encontrado"})
+        elif url.path == "/geocode" and "postcode" in params:
+            result = self.service.geocode(params["postcode"], params.get("country"), params.get("municipality"))
+            self._send(200 if result else 503, result or {"error": "geocoder no disponible"})
+        else:
+            self._send(404, {"error": "ruta desconocida"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        try:
+            jobs = _parse_jobs(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except (ValueError, UnicodeDecodeError) as e:   # JSONDecodeError es un ValueError
+            self._send(400, {"error": f"cuerpo no válido: {e}"})
+            return
+        if url.path == "/optimize":
+            job_id = self.service.submit(jobs[0])
+            self._send(200, self.service.result(job_id, wait=True))
+        elif url.path == "/jobs":
+            self._send(202, {"jobs": [self.service.submit(job) for job in jobs]})
+        else:
+            self._send(404, {"error": "ruta desconocida"})
+
+    def _send(self, status, body):
+        payload = json.dumps(body, ensure_ascii=False, default=_json_default).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"No serializable: {type(value)}")
+
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, workers=SERVICE_WORKERS):
+    ServiceHandler.service = OptimizationService(workers=workers)
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    print(f"Servicio de optimización escuchando en http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        ServiceHandler.service.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import polars as pl
+from pathlib import Path
+from src.config import CACHE_DIR, ensure_dirs
+
+STORE_VERSION = 1
+STORE_COLUMNS = ["id", "name", "zip", "country", "lat", "lng"]
+
+
+def source_hash(path):
+    """SHA-256 del fichero fuente (invalida el almacén cuando cambia)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_paths(source, store_dir=CACHE_DIR):
+    """Rutas del fichero Arrow IPC y de su sidecar de metadatos."""
+    source = Path(source)
+    return store_dir / f"{source.stem}.arrow", store_dir / f"{source.stem}.arrow.meta.json"
+
+
+def _read_source(source):
+    """
+    Lee la fuente en formato tabular. Acepta el JSON anidado por código postal
+    (`cliente_ubi.json`) o la salida plana del notebook (CSV/Parquet con
+    codigo_postal, municipio_destino, pais_destino, latitude, longitude).
+    """
+    if source.suffix == ".json":
+        with open(source, 'r', encoding='utf-8') as f:
+            raw_data = json.load(f)
+        df = (
+            pl.DataFrame({"codigo_postal": list(raw_data.keys()), "datos": list(raw_data.values())})
+            .explode("datos")
+            .unnest("datos")
+        )
+    elif source.suffix == ".parquet":
+        df = pl.read_parquet(source)
+    else:
+        df = pl.read_csv(source, schema_overrides={"codigo_postal": pl.String})
+
+    return df.select(
+        pl.format("C_{}_{}", pl.col("codigo_postal"), pl.col("municipio_destino").str.slice(0, 3))
+          .str.to_uppercase().alias("id"),
+        pl.col("municipio_destino").alias("name"),
+        pl.col("codigo_postal").cast(pl.String).alias("zip"),
+        pl.col("pais_destino").alias("country"),
+        pl.col("latitude").cast(pl.Float64).alias("lat"),
+        pl.col("longitude").cast(pl.Float64).alias("lng"),
+    )
+
+
+def compile_client_store(source, store_dir=CACHE_DIR):
+    """Convierte la fuente de clientes en un Arrow IPC columnar (paso único)."""
+    source = Path(source)
+    target, meta_path = store_paths(source, store_dir)
+    df = _read_source(source)
+    ensure_dirs(store_dir)
+    # Sin compresión: permite mapear el fichero en memoria sin copias al leerlo
+    df.write_ipc(target, compression="uncompressed")
+    meta = {"version": STORE_VERSION, "source": source.name, "source_hash": source_hash(source), "rows": df.height}
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    print(f"Client store: {df.height} clientes compilados en {target.name}")
+    return target
+
+
+def is_store_fresh(source, store_dir=CACHE_DIR):
+    target, meta_path = store_paths(source, store_dir)
+    if not target.exists() or not meta_path.exists():
+        return False
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    return meta.get("version") == STORE_VERSION and meta.get("source_hash") == source_hash(source)
+
+
+def load_client_store(source, store_dir=CACHE_DIR):
+    """
+    Devuelve la tabla de clientes (id, name, zip, country, lat, lng) mapeada en memoria.
+    Solo vuelve a leer la fuente si su hash ha cambiado desde la última compilación.
+    """
+    source = Path(source)
+    target, _ = store_paths(source, store_dir)
+    if not is_store_fresh(source, store_dir):
+        compile_client_store(source, store_dir)
+    # Polars mapea en memoria los IPC sin comprimir por defecto (lectura sin copias)
+    return pl.read_ipc(target)
+
+
+if __name__ == "__main__":
+    import sys
+    from src.config import DATA_DIR
+
+    for path in sys.argv[1:] or [DATA_DIR / "cliente_ubi.json"]:
+        compile_client_store(path)
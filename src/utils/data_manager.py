@@ -1,69 +1,177 @@
-import json
+import hashlib
 import numpy as np
 import polars as pl
 from pathlib import Path
+from src.utils.geo import haversine_kernel, EARTH_RADIUS_M
+from src.utils.spatial_index import ClientSpatialIndex
+from src.utils.client_store import load_client_store
+from src.config import CORRIDOR_INDEX_KM, CUSTOMER_ASSIGNMENT, ASSIGNMENT_MAX_CELLS
 
 class DataManager:
     def __init__(self, paper_plant, carton_plants, clients_file):
         self.paper_plant = paper_plant
         self.carton_plants = carton_plants
         self.clients_file = Path(clients_file)
+        self._clients = None     # Tabla de clientes (Polars), cargada una sola vez
+        self._spatial = None     # Índice espacial (KD-tree) sobre los clientes
+        self._corridor = None    # Índice de desvíos por planta (ver build_corridor_index)
 
     def haversine(self, lat1, lon1, lat2, lon2):
-        """Calcula la distancia Haversine simplificada en km."""
-        R = 6371  # Radio de la Tierra en km
-        dlat = np.radians(lat2 - lat1)
-        dlon = np.radians(lon2 - lon1)
-        a = np.sin(dlat/2)**2 + np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * np.sin(dlon/2)**2
-        return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
-
-    def get_optimized_locations(self, max_customers_per_plant=3, threshold_km=80):
+        """Calcula la distancia Haversine en km (mismo kernel que GeoUtils)."""
+        return haversine_kernel(lat1, lon1, lat2, lon2, radius=EARTH_RADIUS_M / 1000)
+
+    def load_clients(self):
+        """Carga la tabla columnar de clientes (memorizada en la instancia)."""
+        if self._clients is not None:
+            return self._clients
+
+        print(f"Data Loader: Procesando clientes de {self.clients_file.name}...")
+        clients = load_client_store(self.clients_file).select("id", "name", "lat", "lng")
+        clients = clients.unique(subset=["lat", "lng"], maintain_order=True)
+        self._clients = self._unique_ids(clients)
+        return self._clients
+
+    @staticmethod
+    def _unique_ids(clients):
+        """
+        Los ids C_{zip}_{municipio[:3]} colisionan (varios puntos del mismo código postal).
+        A los repetidos se les añade un sufijo derivado de sus coordenadas: el id no
+        depende del orden del fichero y se mantiene entre ejecuciones (warm start).
+        """
+        duplicated = clients["id"].is_duplicated()
+        if not duplicated.any():
+            return clients
+        suffixes = [
+            "" if not dup else "_" + hashlib.sha1(f"{lat:.5f},{lng:.5f}".encode()).hexdigest()[:6]
+            for dup, lat, lng in zip(duplicated, clients["lat"], clients["lng"])
+        ]
+        return clients.with_columns(pl.col("id") + pl.Series(suffixes, dtype=pl.String))
+
+    def build_corridor_index(self, coverage_km=CORRIDOR_INDEX_KM):
+        """
+        Precalcula, para cada planta, el desvío (P->C + C->M) - P->M de los clientes
+        candidatos y su orden ascendente. Los candidatos salen de una consulta por
+        radio al índice espacial, así que solo se evalúa el desvío exacto dentro del
+        pasillo de `coverage_km`. Después cualquier threshold_km <= coverage_km se
+        resuelve con una búsqueda binaria, sin recalcular nada.
+        """
+        if self._corridor is not None and self._corridor["coverage_km"] >= coverage_km:
+            return self._corridor
+
+        df_clients = self.load_clients()
+        c_lats = df_clients["lat"].to_numpy()
+        c_lngs = df_clients["lng"].to_numpy()
+        if self._spatial is None:
+            self._spatial = ClientSpatialIndex(c_lats, c_lngs)
+        m_lat, m_lng = self.paper_plant['lat'], self.paper_plant['lng']
+        dist_cm = self.haversine(c_lats, c_lngs, m_lat, m_lng)
+
+        orders, sorted_detours = [], []
+        for plant in self.carton_plants:
+            p_lat, p_lng = plant['lat'], plant['lng']
+            dist_pm = float(self.haversine(p_lat, p_lng, m_lat, m_lng))
+            candidates = self._spatial.query_corridor((p_lat, p_lng), (m_lat, m_lng), dist_pm, coverage_km)
+
+            # Desvío exacto solo sobre los candidatos de la bola
+            dist_pc = self.haversine(p_lat, p_lng, c_lats[candidates], c_lngs[candidates])
+            detours = (dist_pc + dist_cm[candidates]) - dist_pm
+            order = np.argsort(detours, kind="stable")
+            orders.append(candidates[order])
+            sorted_detours.append(detours[order])
+
+        self._corridor = {
+            "coverage_km": coverage_km,
+            "order": orders,                    # índices de cliente por desvío (por planta)
+            "sorted_detours": sorted_detours,
+        }
+        return self._corridor
+
+    def select_customers(self, plant_idx, max_customers_per_plant, threshold_km):
+        """Devuelve (índices de cliente, desvíos) de los mejores candidatos de una planta."""
+        corridor = self.build_corridor_index(max(CORRIDOR_INDEX_KM, threshold_km))
+        sorted_detours = corridor["sorted_detours"][plant_idx]
+        k = min(int(np.searchsorted(sorted_detours, threshold_km, side="left")), max_customers_per_plant)
+        return corridor["order"][plant_idx][:k], sorted_detours[:k]
+
+    def assign_customers(self, max_customers_per_plant, threshold_km):
+        """
+        Asignación global cliente -> planta: cada cliente va como mucho a una planta, cada
+        planta recibe hasta `max_customers_per_plant` y se minimiza el desvío total
+        (maximizando antes el número de clientes asignados). Se resuelve como asignación
+        de coste mínimo sobre la matriz plantas x clientes (cada planta replicada tantas
+        veces como su capacidad); si la matriz supera ASSIGNMENT_MAX_CELLS se usa una
+        asignación voraz por desvío creciente. Devuelve, por planta, (índices, desvíos).
+        """
+        n_plants, k = len(self.carton_plants), max_customers_per_plant
+        empty = [(np.empty(0, dtype=np.int64), np.empty(0)) for _ in range(n_plants)]
+        if k <= 0 or n_plants == 0:
+            return empty
+
+        # Una planta nunca necesita más allá de sus n_plants*k mejores candidatos:
+        # el resto de plantas solo puede quitarle (n_plants-1)*k
+        candidates = [self.select_customers(p, n_plants * k, threshold_km) for p in range(n_plants)]
+        clients = np.unique(np.concatenate([idx for idx, _ in candidates]))
+        if clients.size == 0:
+            return empty
+        cost = np.full((clients.size, n_plants), np.inf)
+        for p, (idx, detours) in enumerate(candidates):
+            cost[np.searchsorted(clients, idx), p] = detours
+
+        if clients.size * n_plants * k <= ASSIGNMENT_MAX_CELLS:
+            from scipy.optimize import linear_sum_assignment
+            feasible = np.isfinite(cost)
+            # Penalización mayor que cualquier suma de desvíos reales: prima asignar más clientes
+            penalty = np.abs(cost[feasible]).sum() + 1.0
+            rows, cols = linear_sum_assignment(np.repeat(np.where(feasible, cost, penalty), k, axis=1))
+            plants = cols // k
+            keep = feasible[rows, plants]
+            rows, plants = rows[keep], plants[keep]
+        else:
+            rows, plants = self._greedy_assignment(cost, k)
+
+        result = []
+        for p in range(n_plants):
+            mine = rows[plants == p]
+            detours = cost[mine, p]
+            order = np.argsort(detours, kind="stable")
+            result.append((clients[mine[order]], detours[order]))
+        return result
+
+    @staticmethod
+    def _greedy_assignment(cost, capacity):
+        """Asignación voraz: pares (cliente, planta) por desvío creciente respetando la capacidad."""
+        r, p = np.nonzero(np.isfinite(cost))
+        order = np.argsort(cost[r, p], kind="stable")
+        assigned = np.zeros(cost.shape[0], dtype=bool)
+        load = np.zeros(cost.shape[1], dtype=np.int64)
+        rows, plants = [], []
+        for i, j in zip(r[order], p[order]):
+            if not assigned[i] and load[j] < capacity:
+                assigned[i] = True
+                load[j] += 1
+                rows.append(i)
+                plants.append(j)
+        return np.array(rows, dtype=np.int64), np.array(plants, dtype=np.int64)
+
+    def get_optimized_locations(self, max_customers_per_plant=3, threshold_km=80, assignment=CUSTOMER_ASSIGNMENT):
         """
         Selecciona clientes que están 'de camino' entre la planta de cartón y Mengíbar.
         Filtro de Retorno: Minimiza el desvío (P->C + C->M) - P->M
+        Con assignment="global" cada cliente se asigna a una sola planta (ver
+        assign_customers); "per_plant" conserva el top-k independiente por planta.
         """
-        print(f"Data Loader: Procesando clientes de {self.clients_file.name}...")
-        
-        with open(self.clients_file, 'r', encoding='utf-8') as f:
-            raw_data = json.load(f)
-        
-        flattened_clients = []
-        for zip_code, destinations in raw_data.items():
-            for dest in destinations:
-                flattened_clients.append({
-                    "id": f"C_{zip_code}_{dest['municipio_destino'][:3]}".upper(),
-                    "name": dest['municipio_destino'],
-                    "lat": float(dest['latitude']),
-                    "lng": float(dest['longitude'])
-                })
-        
-        df_clients = pl.DataFrame(flattened_clients).unique(subset=["lat", "lng"])
-        
-        m_lat, m_lng = self.paper_plant['lat'], self.paper_plant['lng']
+        df_clients = self.load_clients()
         final_carton_plants = []
+        if assignment == "global":
+            selection = self.assign_customers(max_customers_per_plant, threshold_km)
+        else:
+            selection = [self.select_customers(p, max_customers_per_plant, threshold_km)
+                         for p in range(len(self.carton_plants))]
         
-        for plant in self.carton_plants:
-            p_lat, p_lng = plant['lat'], plant['lng']
-            dist_pm = self.haversine(p_lat, p_lng, m_lat, m_lng)
-            
-            # Vectorizar cálculo de desvío
-            c_lats = df_clients["lat"].to_numpy()
-            c_lngs = df_clients["lng"].to_numpy()
-            
-            dist_pc = self.haversine(p_lat, p_lng, c_lats, c_lngs)
-            dist_cm = self.haversine(c_lats, c_lngs, m_lat, m_lng)
-            detours = (dist_pc + dist_cm) - dist_pm
-            
-            df_temp = df_clients.with_columns(pl.Series("detour", detours))
-            
-            # Seleccionar los mejores clientes en el pasillo de retorno
-            # Usamos un umbral mayor para asegurar que hayamos cubierto la mayoría de España
-            eligible_customers = (
-                df_temp.filter(pl.col("detour") < threshold_km)
-                .sort("detour")
-                .head(max_customers_per_plant)
-                .to_dicts()
-            )
+        for p_idx, plant in enumerate(self.carton_plants):
+            # Clientes seleccionados en el pasillo de retorno
+            idx, detours = selection[p_idx]
+            eligible_customers = df_clients[idx].with_columns(pl.Series("detour", detours)).to_dicts()
             
             new_plant = plant.copy()
             new_plant["customers"] = eligible_customers
@@ -0,0 +1,92 @@
+import sqlite3
+import time
+import numpy as np
+from pathlib import Path
+from src.config import DISTANCE_CACHE_FILE, DISTANCE_CACHE_TTL_DAYS, CACHE_COORD_DECIMALS, ensure_dirs
+
+
+class DistanceCache:
+    """
+    Caché persistente de distancias por pares (lat,lng) redondeados.
+    Cada entrada guarda su procedencia ('road' = Google, 'haversine' = estimación)
+    y la fecha de obtención para aplicar el TTL.
+    """
+    SOURCE_ROAD = "road"
+    SOURCE_HAVERSINE = "haversine"
+
+    def __init__(self, path=DISTANCE_CACHE_FILE, ttl_days=DISTANCE_CACHE_TTL_DAYS, decimals=CACHE_COORD_DECIMALS):
+        self.path = path
+        self.ttl_seconds = ttl_days * 86400
+        self.scale = 10 ** decimals
+        ensure_dirs(Path(path).parent)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pair_cache (
+                o_lat INTEGER, o_lng INTEGER, d_lat INTEGER, d_lng INTEGER,
+                distance_m REAL NOT NULL,
+                source TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (o_lat, o_lng, d_lat, d_lng)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    def _keys(self, nodes):
+        """Claves enteras (lat, lng) redondeadas de cada nodo."""
+        if hasattr(nodes, "lat"):   # NodeTable: columnas directas, sin vistas dict
+            coords = np.column_stack((nodes.lat, nodes.lng))
+        else:
+            coords = np.array([(n['lat'], n['lng']) for n in nodes], dtype=np.float64).reshape(-1, 2)
+        return np.rint(coords * self.scale).astype(np.int64)
+
+    def lookup(self, nodes):
+        """
+        Lectura masiva de la submatriz cacheada (una sola consulta).
+        Devuelve (valores, encontrado, es_carretera) como matrices NxN.
+        """
+        n = len(nodes)
+        values = np.full((n, n), np.nan)
+        found = np.zeros((n, n), dtype=bool)
+        road = np.zeros((n, n), dtype=bool)
+        if n == 0:
+            return values, found, road
+
+        keys = self._keys(nodes)
+        cur = self.conn.cursor()
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS req_nodes (idx INTEGER, lat INTEGER, lng INTEGER)")
+        cur.execute("DELETE FROM req_nodes")
+        cur.executemany("INSERT INTO req_nodes VALUES (?, ?, ?)",
+                        [(i, int(lat), int(lng)) for i, (lat, lng) in enumerate(keys)])
+        rows = cur.execute("""
+            SELECT o.idx, d.idx, c.distance_m, c.source
+            FROM req_nodes o
+            JOIN req_nodes d
+            JOIN pair_cache c
+              ON c.o_lat = o.lat AND c.o_lng = o.lng AND c.d_lat = d.lat AND c.d_lng = d.lng
+            WHERE c.fetched_at >= ?
+        """, (time.time() - self.ttl_seconds,)).fetchall()
+
+        if rows:
+            oi, di, dist, src = zip(*rows)
+            oi, di = np.array(oi), np.array(di)
+            values[oi, di] = dist
+            found[oi, di] = True
+            road[oi, di] = np.array(src) == self.SOURCE_ROAD
+        return values, found, road
+
+    def store(self, nodes, rows, cols, distances, source=SOURCE_ROAD):
+        """Guarda (o refresca) las celdas indicadas por índices de nodo."""
+        if len(rows) == 0:
+            return
+        keys = self._keys(nodes)
+        now = time.time()
+        records = [
+            (int(keys[i, 0]), int(keys[i, 1]), int(keys[j, 0]), int(keys[j, 1]), float(d), source, now)
+            for i, j, d in zip(rows, cols, distances)
+        ]
+        self.conn.executemany("INSERT OR REPLACE INTO pair_cache VALUES (?, ?, ?, ?, ?, ?, ?)", records)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
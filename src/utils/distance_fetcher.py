@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from src.config import (
+    DM_MAX_ORIGINS, DM_MAX_DESTINATIONS, DM_MAX_ELEMENTS,
+    DM_QPS, DM_MAX_WORKERS, DM_MAX_RETRIES, DM_BACKOFF_BASE,
+)
+
+
+class BillingError(Exception):
+    """La API rechaza la petición (clave sin facturación / REQUEST_DENIED)."""
+
+
+class TokenBucket:
+    """Limitador de peticiones por segundo compartido entre hilos."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class DistanceMatrixFetcher:
+    """
+    Descarga una matriz NxN de Google Distance Matrix en teselas origen x destino
+    que respetan los límites de la API (25 orígenes, 25 destinos, 100 elementos).
+    Las teselas se lanzan en paralelo con un token bucket de QPS, reintentos con
+    backoff exponencial y aislamiento de fallos: una tesela que falla deja sus
+    celdas sin valor (el llamador conserva la estimación Haversine).
+    """
+
+    def __init__(self, client, qps=DM_QPS, max_workers=DM_MAX_WORKERS, max_retries=DM_MAX_RETRIES,
+                 backoff_base=DM_BACKOFF_BASE, max_origins=DM_MAX_ORIGINS,
+                 max_destinations=DM_MAX_DESTINATIONS, max_elements=DM_MAX_ELEMENTS):
+        self.client = client
+        self.bucket = TokenBucket(qps)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_origins = max_origins
+        self.max_destinations = max_destinations
+        self.max_elements = max_elements
+        self.stats = {"requests": 0, "retries": 0, "failed_tiles": 0, "tiles": 0}
+        self._stats_lock = threading.Lock()
+        self._abort = threading.Event()
+
+    def tiles(self, missing):
+        """Genera teselas (filas, columnas) que cubren todas las celdas pendientes."""
+        pending_rows = np.flatnonzero(missing.any(axis=1))
+        dest_chunk = min(self.max_destinations, self.max_elements)
+        rows_per_tile = max(1, min(self.max_origins, self.max_elements // dest_chunk))
+        for r0 in range(0, len(pending_rows), rows_per_tile):
+            rows = pending_rows[r0:r0 + rows_per_tile]
+            cols_needed = np.flatnonzero(missing[rows].any(axis=0))
+            for c0 in range(0, len(cols_needed), dest_chunk):
+                yield rows, cols_needed[c0:c0 + dest_chunk]
+
+    def fetch(self, coords, missing):
+        """
+        Obtiene las celdas marcadas en `missing` (NxN bool).
+        Devuelve (valores, ok, respondidas): valores en metros (NaN si no hay dato
+        de carretera), la máscara de celdas resueltas por carretera y la de celdas
+        cuya tesela respondió (aunque el elemento no tenga ruta). Lanza
+        BillingError si la API deniega el acceso.
+        """
+        n = len(coords)
+        values = np.full((n, n), np.nan)
+        ok = np.zeros((n, n), dtype=bool)
+        answered = np.zeros((n, n), dtype=bool)
+        tiles = list(self.tiles(missing))
+        self.stats["tiles"] = len(tiles)
+        self._abort.clear()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._fetch_tile, coords, rows, cols): (rows, cols) for rows, cols in tiles}
+            try:
+                for future in as_completed(futures):
+                    rows, cols = futures[future]
+                    result = future.result()
+                    if result is None:
+                        self._count("failed_tiles")
+                        continue
+                    tile_values, tile_ok = result
+                    values[np.ix_(rows, cols)] = tile_values
+                    ok[np.ix_(rows, cols)] = tile_ok
+                    answered[np.ix_(rows, cols)] = True
+            except BillingError:
+                self._abort.set()
+                for f in futures:
+                    f.cancel()
+                raise
+        return values, ok & missing, answered & missing
+
+    def _fetch_tile(self, coords, rows, cols):
+        """Pide una tesela con reintentos; devuelve None si se agotan."""
+        origins = [coords[i] for i in rows]
+        destinations = [coords[j] for j in cols]
+        for attempt in range(self.max_retries + 1):
+            if self._abort.is_set():
+                return None
+            self.bucket.acquire()
+            self._count("requests")
+            try:
+                response = self.client.distance_matrix(origins, destinations, mode="driving")
+                status = response.get('status')
+                if status == 'OK':
+                    return self._parse(response, len(rows), len(cols))
+                if status == 'REQUEST_DENIED':
+                    raise BillingError(response.get('error_message', status))
+            except BillingError:
+                raise
+            except Exception as e:
+                if getattr(e, 'status', None) == 'REQUEST_DENIED' or 'billing' in str(e).lower():
+                    raise BillingError(str(e))
+            if attempt < self.max_retries:
+                self._count("retries")
+                # Backoff exponencial con jitter para no sincronizar los hilos
+                time.sleep(self.backoff_base * (2 ** attempt) * (0.5 + random.random()))
+        return None
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    @staticmethod
+    def _parse(response, n_rows, n_cols):
+        values = np.full((n_rows, n_cols), np.nan)
+        ok = np.zeros((n_rows, n_cols), dtype=bool)
+        for r, row in enumerate(response['rows'][:n_rows]):
+            for c, element in enumerate(row['elements'][:n_cols]):
+                if element.get('status') == 'OK':
+                    values[r, c] = element['distance']['value']
+                    ok[r, c] = True
+                elif element.get('status') == 'REQUEST_DENIED':
+                    raise BillingError(element.get('status'))
+        return values, ok
@@ -1,86 +1,253 @@
-import googlemaps
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from src.config import GOOGLE_MAPS_API_KEY
+from src.config import GOOGLE_MAPS_API_KEY, GOOGLE_MAPS_BASE_URL, DISTANCE_MODE, DISTANCE_DTYPE, DISTANCE_BLOCK_ROWS
+from src.config import DM_QPS, POLYLINE_MAX_WORKERS, POLYLINE_SIMPLIFY_M
+from src.utils.distance_cache import DistanceCache
+from src.utils.distance_fetcher import DistanceMatrixFetcher, BillingError, TokenBucket
+from src.utils.polyline_cache import PolylineCache
+from src.utils.profiling import metrics
+
+EARTH_RADIUS_M = 6371000.0  # Radio Tierra en metros
+API_UNAVAILABLE = "API_UNAVAILABLE"   # Tramo sin respuesta de la API (nunca se cachea)
+
+
+def haversine_kernel(lat1, lon1, lat2, lon2, radius=EARTH_RADIUS_M):
+    """
+    Distancia Haversine vectorizada (en las unidades de `radius`).
+    Acepta escalares o arrays en grados y aplica broadcasting de NumPy.
+    """
+    lat1, lon1 = np.radians(lat1), np.radians(lon1)
+    lat2, lon2 = np.radians(lat2), np.radians(lon2)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return radius * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def equirectangular_kernel(lat1, lon1, lat2, lon2, radius=EARTH_RADIUS_M):
+    """
+    Aproximación equirectangular (más barata, sin arctan2).
+    Error despreciable a escala peninsular; útil para instancias muy grandes.
+    """
+    lat1, lon1 = np.radians(lat1), np.radians(lon1)
+    lat2, lon2 = np.radians(lat2), np.radians(lon2)
+    x = (lon2 - lon1) * np.cos((lat1 + lat2) / 2)
+    y = lat2 - lat1
+    return radius * np.sqrt(x * x + y * y)
+
+
+DISTANCE_KERNELS = {
+    "haversine": haversine_kernel,
+    "equirectangular": equirectangular_kernel,
+}
+
+
+def distance_matrix(lats, lngs, mode=DISTANCE_MODE, dtype=DISTANCE_DTYPE, block_rows=DISTANCE_BLOCK_ROWS):
+    """
+    Construye la matriz NxN (metros) a partir de arrays de coordenadas.
+
+    Solo se evalúa el triángulo superior, por bloques de `block_rows` filas,
+    y se refleja sobre el inferior: la memoria temporal queda acotada a
+    block_rows x N aunque la instancia tenga 10k+ nodos.
+    `dtype` admite 'float64', 'float32' o 'int32' (metros redondeados).
+    """
+    kernel = DISTANCE_KERNELS[mode]
+    dtype = np.dtype(dtype)
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    n = lats.shape[0]
+    matrix = np.zeros((n, n), dtype=dtype)
+
+    for start in range(0, n, block_rows):
+        stop = min(start + block_rows, n)
+        block = kernel(lats[start:stop, None], lngs[start:stop, None], lats[None, start:], lngs[None, start:])
+        if dtype.kind == 'i':
+            block = np.rint(block)
+        block = block.astype(dtype, copy=False)
+        matrix[start:stop, start:] = block
+        matrix[start:, start:stop] = block.T
+    np.fill_diagonal(matrix, 0)
+    return matrix
+
+
+def simplify_polyline(points, tolerance_m=POLYLINE_SIMPLIFY_M):
+    """
+    Douglas-Peucker sobre una lista de (lat, lng). Proyecta a metros con una
+    aproximación equirectangular local y conserva solo los vértices que se separan
+    más de `tolerance_m` de la cuerda. Iterativo (pila) para no depender de la recursión.
+    """
+    if len(points) < 3 or tolerance_m <= 0:
+        return list(points)
+    pts = np.asarray(points, dtype=np.float64)
+    lat0 = np.radians(pts[:, 0].mean())
+    xy = np.column_stack((np.radians(pts[:, 1]) * np.cos(lat0), np.radians(pts[:, 0]))) * EARTH_RADIUS_M
+
+    keep = np.zeros(len(pts), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(pts) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        seg = xy[last] - xy[first]
+        rel = xy[first + 1:last] - xy[first]
+        seg_len = np.hypot(*seg)
+        if seg_len == 0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / seg_len
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance_m:
+            split = first + 1 + k
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return pts[keep].tolist()
+
+
+def node_coords(nodes):
+    """(lats, lngs) como arrays float64; usa directamente las columnas si `nodes` es una NodeTable."""
+    if hasattr(nodes, "lat"):
+        return nodes.lat, nodes.lng
+    lats = np.fromiter((n['lat'] for n in nodes), dtype=np.float64, count=len(nodes))
+    lngs = np.fromiter((n['lng'] for n in nodes), dtype=np.float64, count=len(nodes))
+    return lats, lngs
+
 
 class GeoUtils:
     _api_disabled = False
 
     def __init__(self):
         self.gmaps = None
+        self.cache = None
+        self.polylines = None
         if GOOGLE_MAPS_API_KEY:
-            self.gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
+            import googlemaps   # Carga diferida: solo hace falta con clave de API
+            # Los reintentos por cuota los gestiona DistanceMatrixFetcher (backoff por tesela)
+            self.gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY, base_url=GOOGLE_MAPS_BASE_URL,
+                                           retry_over_query_limit=False, queries_per_second=1000)
+            self.cache = DistanceCache()
+            self.polylines = PolylineCache()
 
     def calculate_distance_matrix(self, nodes):
         """
         Calcula la matriz de distancias (en metros) entre todos los nodos.
-        Utiliza Google Maps API con optimización de lotes por origen.
+        Lee primero la caché persistente y solo pide a Google Maps los pares que faltan.
+        El indicador devuelto dice si la matriz contiene distancias por carretera (según
+        la procedencia de cada celda, no según si se consultó la API).
         """
-        num_nodes = len(nodes)
-        matrix = np.zeros((num_nodes, num_nodes))
+        # La estimación en línea recta sirve de base: las celdas sin respuesta de la API la conservan
+        matrix = self.haversine_matrix(nodes)
         
         # Primero intentamos con Google Maps
         use_roadmap = self.gmaps is not None and not GeoUtils._api_disabled
         
         if use_roadmap:
-            print("Fetching Real Road Distances from Google Maps (Origin-by-Origin Batching)...")
+            with metrics.timed("distance_cache.lookup"):
+                cached, found, road = self.cache.lookup(nodes)
+            matrix[found] = cached[found]
+            missing = ~found
+            np.fill_diagonal(missing, False)
+            metrics.incr("distance_cache.hits", int(found.sum()))
+            metrics.incr("distance_cache.misses", int(missing.sum()))
+            print(f"Distance cache: {int(found.sum())}/{found.size} pares en caché, {int(missing.sum())} pendientes.")
+            if not missing.any():
+                return matrix, bool(road.any())
+
+            print("Fetching Real Road Distances from Google Maps (tiled, concurrent)...")
             try:
-                for i in range(num_nodes):
-                    # Google Matrix API permite hasta 25 destinos por origen
-                    origins = [(nodes[i]['lat'], nodes[i]['lng'])]
-                    destinations = [(n['lat'], n['lng']) for n in nodes]
-                    
-                    response = self.gmaps.distance_matrix(
-                        origins, 
-                        destinations, 
-                        mode="driving"
-                    )
-                    
-                    if response['status'] == 'OK':
-                        row_results = response['rows'][0]['elements']
-                        for j, result in enumerate(row_results):
-                            if result['status'] == 'OK':
-                                matrix[i][j] = result['distance']['value']
-                            else:
-                                if result.get('status') == 'REQUEST_DENIED' or 'billing' in str(result).lower():
-                                    raise Exception("BILLING_ERROR")
-                                matrix[i][j] = self.haversine_distance(nodes[i], nodes[j])
-                    else:
-                        raise Exception("API_ERROR")
-                return matrix, True
+                coords = list(zip(*node_coords(nodes)))
+                fetcher = DistanceMatrixFetcher(self.gmaps)
+                with metrics.timed("gmaps.distance_matrix.fetch"):
+                    values, fetched_road, answered = fetcher.fetch(coords, missing)
+                for key, value in fetcher.stats.items():
+                    metrics.incr(f"gmaps.distance_matrix.{key}", value)
+                matrix[fetched_road] = values[fetched_road]
+                road |= fetched_road
+                rows, cols = np.nonzero(fetched_road)
+                self.cache.store(nodes, rows, cols, values[fetched_road])
+                # Pares sin ruta por carretera (p.ej. islas): se recuerda la estimación.
+                # Las teselas caídas no se cachean para reintentarlas en la próxima ejecución.
+                no_route = answered & ~fetched_road
+                rows, cols = np.nonzero(no_route)
+                self.cache.store(nodes, rows, cols, matrix[no_route], source=DistanceCache.SOURCE_HAVERSINE)
+                if fetcher.stats["failed_tiles"]:
+                    print(f"AVISO: {fetcher.stats['failed_tiles']}/{fetcher.stats['tiles']} teselas fallidas; "
+                          f"esas celdas usan estimación Haversine.")
+                return matrix, bool(road.any())
             except Exception as e:
-                if "BILLING" in str(e).upper():
+                # Las celdas de la caché se conservan: solo las pendientes quedan en Haversine
+                if isinstance(e, BillingError) or "BILLING" in str(e).upper():
                     print("AVISO: Google Maps Billing no activo. Usando estimación Haversine (Línea recta).")
                     GeoUtils._api_disabled = True
                 else:
-                    print(f"Error en API Google: {e}. Usando estimación Haversine.")
-        
-        # Fallback a Haversine
-        for i in range(num_nodes):
-            for j in range(num_nodes):
-                matrix[i][j] = self.haversine_distance(nodes[i], nodes[j])
+                    print(f"Error en API Google: {e}. Usando estimación Haversine en los pares pendientes.")
+            return matrix, bool(road.any())
+
+        # Fallback a Haversine (vectorizado)
         return matrix, False
 
+    def haversine_matrix(self, nodes, mode=DISTANCE_MODE, dtype=DISTANCE_DTYPE):
+        """Matriz de distancias en línea recta (metros) calculada en bloque."""
+        lats, lngs = node_coords(nodes)
+        return distance_matrix(lats, lngs, mode=mode, dtype=dtype)
+
     def haversine_distance(self, node_a, node_b):
         """Calcula la distancia en línea recta (metros) entre dos puntos GPS."""
-        R = 6371000 # Radio Tierra en metros
-        lat1, lon1 = np.radians(node_a['lat']), np.radians(node_a['lng'])
-        lat2, lon2 = np.radians(node_b['lat']), np.radians(node_b['lng'])
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
-        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
-        return R * c
+        return float(haversine_kernel(node_a['lat'], node_a['lng'], node_b['lat'], node_b['lng']))
 
     def get_route_polyline(self, start_coords, end_coords):
-        """Obtiene la geometría de la carretera entre dos puntos."""
+        """
+        Obtiene la geometría de la carretera entre dos puntos. None solo si la API confirma
+        que no hay ruta; API_UNAVAILABLE si no hubo respuesta (API desactivada o error).
+        """
         if not self.gmaps or GeoUtils._api_disabled:
-            return None
+            return API_UNAVAILABLE
         try:
-            result = self.gmaps.directions(
-                start_coords, end_coords, mode="driving"
-            )
-            if result:
-                return result[0]['overview_polyline']['points']
-        except Exception:
-            return "BILLING_ERROR"
+            with metrics.timed("gmaps.directions"):
+                result = self.gmaps.directions(
+                    start_coords, end_coords, mode="driving"
+                )
+        except Exception as e:
+            if isinstance(e, BillingError) or "BILLING" in str(e).upper():
+                GeoUtils._api_disabled = True
+            return API_UNAVAILABLE
+        if result:
+            return result[0]['overview_polyline']['points']
         return None
+
+    def get_route_polylines(self, legs, max_workers=POLYLINE_MAX_WORKERS, tolerance_m=POLYLINE_SIMPLIFY_M):
+        """
+        Geometrías de varios tramos ((lat, lng), (lat, lng)) de una vez: deduplica,
+        sirve desde la caché persistente y descarga los que faltan en paralelo
+        (acotado a `max_workers` y al QPS compartido). Devuelve {tramo: [[lat, lng], ...]}
+        ya simplificado, o None si no hay geometría (el mapa dibuja el tramo directo).
+        """
+        unique = list(dict.fromkeys(legs))
+        encoded = {}
+        if self.polylines is not None:
+            with metrics.timed("polyline_cache.lookup"):
+                encoded = self.polylines.lookup(unique)
+        missing = [leg for leg in unique if leg not in encoded]
+        metrics.incr("polyline_cache.hits", len(encoded))
+        metrics.incr("polyline_cache.misses", len(missing))
+
+        if missing and self.gmaps and not GeoUtils._api_disabled:
+            print(f"Polilíneas: {len(encoded)}/{len(unique)} tramos en caché, descargando {len(missing)}...")
+            bucket = TokenBucket(DM_QPS)
+
+            def fetch(leg):
+                bucket.acquire()
+                return leg, self.get_route_polyline(*leg)
+
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                fetched = dict(pool.map(fetch, missing))
+            # Solo se cachean respuestas de la API (geometría o "sin ruta" confirmado); los
+            # tramos sin respuesta (error, cuota, API desactivada a mitad) se reintentan
+            fetched = {leg: points for leg, points in fetched.items() if points != API_UNAVAILABLE}
+            self.polylines.store(fetched)
+            encoded.update(fetched)
+
+        import polyline
+        return {
+            leg: simplify_polyline(polyline.decode(encoded[leg]), tolerance_m) if encoded.get(leg) else None
+            for leg in unique
+        }
@@ -0,0 +1,207 @@
+import json
+import polars as pl
+from pathlib import Path
+from src.config import ensure_dirs, CACHE_DIR, DATA_DIR, GEOCODER_SOURCES, GEOCODER_PREFIX_LENGTHS
+from src.utils.client_store import source_hash
+
+INDEX_VERSION = 1
+
+# Columnas según el readme de GeoNames (fichero tab-delimited sin cabecera)
+GEONAMES_COLUMNS = [
+    "country_code", "postal_code", "place_name",
+    "admin_name1", "admin_code1", "admin_name2", "admin_code2",
+    "admin_name3", "admin_code3", "latitude", "longitude", "accuracy"
+]
+
+COUNTRY_ALIASES = {"españa": "ES", "espana": "ES", "spain": "ES", "es": "ES", "portugal": "PT", "pt": "PT"}
+
+
+def read_geonames(path):
+    """Lee un fichero postal de GeoNames (ES.txt, PT.txt...)."""
+    return pl.read_csv(
+        path,
+        separator="\t",
+        has_header=False,
+        new_columns=GEONAMES_COLUMNS,
+        encoding="utf8",
+        infer_schema_length=0,   # Todo como texto: los CP conservan los ceros a la izquierda
+        quote_char=None,
+    ).with_columns(
+        pl.col("latitude").cast(pl.Float64),
+        pl.col("longitude").cast(pl.Float64),
+    )
+
+
+def clean_postcode(expr):
+    """CP como texto limpio (sin espacios ni sufijos '.0' de columnas numéricas)."""
+    return expr.cast(pl.String).str.strip_chars().str.replace(r"\.0$", "")
+
+
+def normalize_postcode(code, country):
+    """Los CP españoles leídos como número recuperan el cero inicial (4001 -> 04001)."""
+    return pl.when((country == "ES") & code.str.contains(r"^\d{4}$")).then(code.str.zfill(5)).otherwise(code)
+
+
+def normalize_name(expr):
+    """Nombre de municipio comparable: minúsculas, sin tildes, sin prefijos 'P-' ni paréntesis."""
+    return (
+        expr.cast(pl.String)
+        .str.normalize("NFKD")
+        .str.replace_all(r"\p{M}", "")
+        .str.to_lowercase()
+        .str.replace(r"^p-", "")
+        .str.replace_all(r"\(.*?\)", "")
+        .str.replace_all(r"[^a-z0-9]+", " ")
+        .str.strip_chars()
+    )
+
+
+def normalize_country(expr, postcode):
+    """Código ISO del país; si falta se infiere del formato del CP (dddd-ddd => PT)."""
+    iso = expr.cast(pl.String).str.strip_chars().str.to_lowercase().replace_strict(
+        COUNTRY_ALIASES, default=None, return_dtype=pl.String)
+    inferred = pl.when(postcode.str.contains(r"^\d{4}-\d{3}$")).then(pl.lit("PT")).otherwise(pl.lit("ES"))
+    return pl.coalesce(iso, inferred)
+
+
+class PostalGeocoder:
+    """
+    Geocodificador por código postal sobre los ficheros de GeoNames.
+
+    El índice (CP exacto, prefijos del CP y municipio normalizado, por país) se
+    construye una vez y se persiste en Arrow IPC; se invalida por el hash de las
+    fuentes. Las búsquedas son joins vectorizados de Polars y aceptan LazyFrames,
+    de modo que un extracto de transporte se puede geocodificar en streaming.
+    Cascada de resolución: CP exacto -> prefijo (de más largo a más corto) -> municipio.
+    """
+
+    def __init__(self, sources=None, store_dir=CACHE_DIR):
+        candidates = [Path(p) for p in (sources or [DATA_DIR / name for name in GEOCODER_SOURCES])]
+        self.sources = [p for p in candidates if p.exists()]
+        if not self.sources:
+            raise FileNotFoundError(f"No hay ficheros GeoNames disponibles: {[str(p) for p in candidates]}")
+        self.index_file = store_dir / "postal_index.arrow"
+        self.meta_file = store_dir / "postal_index.arrow.meta.json"
+        self.index = self._load_or_build()
+        self._levels = {level: df.drop("level") for (level,), df in self.index.group_by("level")}
+
+    def _sources_signature(self):
+        return {p.name: source_hash(p) for p in self.sources}
+
+    def _load_or_build(self):
+        signature = self._sources_signature()
+        if self.index_file.exists() and self.meta_file.exists():
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("version") == INDEX_VERSION and meta.get("sources") == signature:
+                return pl.read_ipc(self.index_file)
+
+        index = self.build_index()
+        ensure_dirs(self.index_file.parent)
+        index.write_ipc(self.index_file, compression="uncompressed")
+        with open(self.meta_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": INDEX_VERSION, "sources": signature, "rows": index.height}, f, indent=2)
+        print(f"Geocoder: índice postal construido ({index.height} claves) desde {[p.name for p in self.sources]}")
+        return index
+
+    def build_index(self):
+        """Índice compacto (level, country, key, lat, lng) con una fila por clave."""
+        ref = pl.concat([read_geonames(p) for p in self.sources]).with_columns(
+            pl.col("country_code").alias("country"),
+            clean_postcode(pl.col("postal_code")).alias("postal_code"),
+        ).with_columns(pl.col("postal_code").str.replace_all("-", "").alias("digits"))
+
+        def aggregate(frame, level, key):
+            return (
+                frame.group_by("country", key.alias("key"))
+                .agg(pl.col("latitude").mean().alias("lat"), pl.col("longitude").mean().alias("lng"))
+                .filter(pl.col("key").is_not_null() & (pl.col("key") != ""))
+                .with_columns(pl.lit(level).alias("level"))
+                .select("level", "country", "key", "lat", "lng")
+            )
+
+        levels = [aggregate(ref, "exact", pl.col("postal_code"))]
+        for n in GEOCODER_PREFIX_LENGTHS:
+            levels.append(aggregate(ref, f"prefix{n}", pl.col("digits").str.slice(0, n)))
+        # Municipio: tanto la localidad (place_name) como el municipio administrativo (admin_name3)
+        names = pl.concat([
+            ref.select("country", "latitude", "longitude", pl.col("place_name").alias("name")),
+            ref.select("country", "latitude", "longitude", pl.col("admin_name3").alias("name")),
+        ])
+        levels.append(aggregate(names, "municipality", normalize_name(pl.col("name"))))
+        return pl.concat(levels).sort("level", "country", "key")
+
+    def geocode_frame(self, frame, cp_col="codigo_postal", municipio_col=None, country_col=None):
+        """
+        Añade latitude / longitude / geo_match a un DataFrame o LazyFrame.
+        geo_match indica el nivel que resolvió la fila (exact, prefixN, municipality) o null.
+        """
+        lazy = frame.lazy().with_row_index("_row")
+        raw = clean_postcode(pl.col(cp_col))
+        country = normalize_country(pl.col(country_col) if country_col else pl.lit(None), raw)
+        code = normalize_postcode(raw, country)
+        keys = [
+            code.alias("_exact"),
+            country.alias("_country"),
+            *[code.str.replace_all("-", "").str.slice(0, n).alias(f"_prefix{n}") for n in GEOCODER_PREFIX_LENGTHS],
+        ]
+        if municipio_col:
+            keys.append(normalize_name(pl.col(municipio_col)).alias("_municipality"))
+        lazy = lazy.with_columns(keys)
+
+        levels = ["exact", *[f"prefix{n}" for n in GEOCODER_PREFIX_LENGTHS]]
+        if municipio_col:
+            levels.append("municipality")
+
+        for level in levels:
+            ref = self._levels.get(level)
+            if ref is None:
+                continue
+            lazy = lazy.join(
+                ref.lazy().rename({"lat": f"_lat_{level}", "lng": f"_lng_{level}"}),
+                left_on=["_country", f"_{level}"], right_on=["country", "key"], how="left",
+            )
+
+        present = [lvl for lvl in levels if lvl in self._levels]
+        match = pl.lit(None, dtype=pl.String)
+        for level in reversed(present):
+            match = pl.when(pl.col(f"_lat_{level}").is_not_null()).then(pl.lit(level)).otherwise(match)
+
+        lazy = lazy.with_columns(
+            pl.coalesce([pl.col(f"_lat_{lvl}") for lvl in present]).alias("latitude"),
+            pl.coalesce([pl.col(f"_lng_{lvl}") for lvl in present]).alias("longitude"),
+            match.alias("geo_match"),
+        ).sort("_row").drop(pl.selectors.starts_with("_"))
+        return lazy if isinstance(frame, pl.LazyFrame) else lazy.collect()
+
+    def geocode(self, postal_codes, municipalities=None, countries=None):
+        """Resuelve un lote de códigos postales a coordenadas (DataFrame en el mismo orden)."""
+        data = {"codigo_postal": pl.Series([None if c is None else str(c) for c in postal_codes], dtype=pl.String)}
+        if municipalities is not None:
+            data["municipio_destino"] = pl.Series(list(municipalities), dtype=pl.String)
+        if countries is not None:
+            data["pais_destino"] = pl.Series(list(countries), dtype=pl.String)
+        return self.geocode_frame(
+            pl.DataFrame(data),
+            municipio_col="municipio_destino" if municipalities is not None else None,
+            country_col="pais_destino" if countries is not None else None,
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Geocodifica un extracto de transporte (CSV) por código postal.")
+    parser.add_argument("input", help="CSV con la columna de código postal")
+    parser.add_argument("output", help="Fichero Parquet de salida")
+    parser.add_argument("--cp-col", default="codigo_postal")
+    parser.add_argument("--municipio-col", default=None)
+    parser.add_argument("--country-col", default=None)
+    args = parser.parse_args()
+
+    geocoder = PostalGeocoder()
+    extract = pl.scan_csv(args.input, infer_schema_length=0)
+    geocoder.geocode_frame(
+        extract, cp_col=args.cp_col, municipio_col=args.municipio_col, country_col=args.country_col
+    ).sink_parquet(args.output)
+    print(f"✅ Extracto geocodificado en {args.output}")
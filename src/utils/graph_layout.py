@@ -0,0 +1,150 @@
+import hashlib
+import json
+import math
+import os
+import time
+import numpy as np
+from src.config import CACHE_DIR, GRAPH_LAYOUT, LAYOUT_CACHE_TTL_DAYS, LAYOUT_CACHE_MAX_FILES, ensure_dirs
+
+LAYOUT_CACHE_DIR = CACHE_DIR / "layouts"
+_memory_cache = {}
+
+
+def build_route_graph(routes, kpis=None):
+    """
+    Grafo dirigido de las rutas (nodos por id, aristas por tramo) y el diccionario
+    id -> nodo. Con `kpis` (RouteKPIs de esas rutas) las aristas llevan el peso en km.
+    """
+    import networkx as nx
+    G = nx.DiGraph()
+    unique_nodes = {}
+    for route in routes:
+        for node in route:
+            unique_nodes.setdefault(node['id'], node)
+            G.add_node(node['id'], name=node['name'], type=node['type'])
+    for r, route in enumerate(routes):
+        if kpis is not None:
+            G.add_edges_from((start['id'], end['id'], {"weight": km})
+                             for start, end, km in zip(route, route[1:], (kpis.legs(r) / 1000).tolist()))
+        else:
+            G.add_edges_from((start['id'], end['id']) for start, end in zip(route, route[1:]))
+    return G, unique_nodes
+
+
+def short_label(name, separator="\n"):
+    """Nombre abreviado en dos líneas para que quepa dentro de la burbuja."""
+    words = name.replace('Smurfit Westrock ', '').split()
+    return separator.join(words[:2]) if len(words) > 1 else words[0] if words else ""
+
+
+def route_signature(routes, method):
+    """Huella de las rutas (orden de ids y coordenadas) para cachear el layout."""
+    digest = hashlib.sha256(method.encode())
+    for route in routes:
+        for node in route:
+            digest.update(f"{node['id']}|{node['lat']:.5f}|{node['lng']:.5f};".encode())
+        digest.update(b"#")
+    return digest.hexdigest()[:24]
+
+
+def geo_layout(unique_nodes):
+    """Proyección equirectangular de lat/lng normalizada a [-1, 1]. O(N)."""
+    ids = list(unique_nodes)
+    lats = np.array([unique_nodes[i]['lat'] for i in ids])
+    lngs = np.array([unique_nodes[i]['lng'] for i in ids])
+    x = lngs * np.cos(np.radians(lats.mean()))
+    y = lats
+    span = max(np.ptp(x), np.ptp(y), 1e-9) / 2
+    x = (x - (x.max() + x.min()) / 2) / span
+    y = (y - (y.max() + y.min()) / 2) / span
+    return {i: (float(a), float(b)) for i, a, b in zip(ids, x, y)}
+
+
+def hierarchical_layout(routes, ring_size=12):
+    """
+    Layout radial depósito -> planta -> clientes en O(N). El depósito va en el centro,
+    cada ruta recibe un sector angular ordenado por el rumbo geográfico de su planta
+    (así la vista conserva la orientación del mapa) y sus clientes se reparten en
+    anillos de `ring_size` por fuera de la planta.
+    """
+    pos = {}
+    if not routes:
+        return pos
+    depot = routes[0][0]
+    pos[depot['id']] = (0.0, 0.0)
+
+    def bearing(route):
+        head = route[1] if len(route) > 1 else route[0]
+        return math.atan2(head['lat'] - depot['lat'], (head['lng'] - depot['lng']) * math.cos(math.radians(depot['lat'])))
+
+    sector = 2 * math.pi / len(routes)
+    for r, route in enumerate(sorted(routes, key=bearing)):
+        center = r * sector + sector / 2
+        stops = [n for n in route[1:-1] if n['id'] not in pos]
+        plants = [n for n in stops if n['type'] != 'customer']
+        customers = [n for n in stops if n['type'] == 'customer']
+        for k, node in enumerate(plants):
+            angle = center + (k - (len(plants) - 1) / 2) * sector / (len(plants) + 1)
+            pos[node['id']] = (math.cos(angle), math.sin(angle))
+        for k, node in enumerate(customers):
+            ring, slot = divmod(k, ring_size)
+            in_ring = min(ring_size, len(customers) - ring * ring_size)
+            angle = center + (slot - (in_ring - 1) / 2) * sector * 0.9 / max(in_ring, 1)
+            radius = 1.8 + 0.4 * ring
+            pos[node['id']] = (radius * math.cos(angle), radius * math.sin(angle))
+    return pos
+
+
+def compute_layout(routes, method=GRAPH_LAYOUT, graph=None, unique_nodes=None):
+    """
+    Posiciones {id: (x, y)} de los nodos de las rutas, calculadas una sola vez por
+    conjunto de rutas: se memorizan en proceso y en CACHE_DIR/layouts (JSON), de modo
+    que el grafo interactivo y el PNG estático reutilizan el mismo layout. Ambas cachés
+    están acotadas a LAYOUT_CACHE_MAX_FILES entradas (y el disco a LAYOUT_CACHE_TTL_DAYS).
+    Métodos: "hierarchical" y "geo" (O(N)) o "spring" (el spring_layout original, O(N²)).
+    """
+    key = route_signature(routes, method)
+    if key in _memory_cache:
+        return _memory_cache[key]
+    cache_file = LAYOUT_CACHE_DIR / f"{key}.json"
+    if cache_file.exists():
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            pos = {node_id: tuple(xy) for node_id, xy in json.load(f).items()}
+        os.utime(cache_file)   # La fecha de modificación hace de último uso para la purga
+        _remember(key, pos)
+        return pos
+
+    if graph is None or unique_nodes is None:
+        graph, unique_nodes = build_route_graph(routes)
+    if method == "hierarchical":
+        pos = hierarchical_layout(routes)
+    elif method == "geo":
+        pos = geo_layout(unique_nodes)
+    elif method == "spring":
+        import networkx as nx
+        pos = {k: tuple(map(float, v)) for k, v in nx.spring_layout(graph, k=0.15, iterations=150, seed=42).items()}
+    else:
+        raise ValueError(f"Layout desconocido: {method}")
+
+    ensure_dirs(LAYOUT_CACHE_DIR)
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump(pos, f)
+    evict_layouts()
+    _remember(key, pos)
+    return pos
+
+
+def _remember(key, pos, max_entries=LAYOUT_CACHE_MAX_FILES):
+    """Caché en proceso acotada (se descarta la entrada más antigua)."""
+    _memory_cache[key] = pos
+    while len(_memory_cache) > max_entries:
+        del _memory_cache[next(iter(_memory_cache))]
+
+
+def evict_layouts(max_files=LAYOUT_CACHE_MAX_FILES, ttl_days=LAYOUT_CACHE_TTL_DAYS):
+    """Borra de disco los layouts sin usar en `ttl_days` y los menos recientes por encima de `max_files`."""
+    files = sorted(LAYOUT_CACHE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    cutoff = time.time() - ttl_days * 86400
+    for i, path in enumerate(files):
+        if i >= max_files or path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,64 @@
+import sqlite3
+import time
+from pathlib import Path
+from src.config import POLYLINE_CACHE_FILE, POLYLINE_CACHE_TTL_DAYS, CACHE_COORD_DECIMALS, ensure_dirs
+
+
+class PolylineCache:
+    """
+    Caché persistente de geometrías por tramo (origen, destino) redondeados.
+    Guarda la polilínea codificada tal y como la devuelve Directions; un valor
+    NULL recuerda que la API no encontró ruta (se dibuja el tramo directo).
+    """
+
+    def __init__(self, path=POLYLINE_CACHE_FILE, ttl_days=POLYLINE_CACHE_TTL_DAYS, decimals=CACHE_COORD_DECIMALS):
+        self.path = path
+        self.ttl_seconds = ttl_days * 86400
+        self.scale = 10 ** decimals
+        ensure_dirs(Path(path).parent)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS leg_cache (
+                o_lat INTEGER, o_lng INTEGER, d_lat INTEGER, d_lng INTEGER,
+                points TEXT,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (o_lat, o_lng, d_lat, d_lng)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    def _key(self, leg):
+        """Clave entera (o_lat, o_lng, d_lat, d_lng) de un tramo ((lat, lng), (lat, lng))."""
+        (o_lat, o_lng), (d_lat, d_lng) = leg
+        return tuple(int(round(v * self.scale)) for v in (o_lat, o_lng, d_lat, d_lng))
+
+    def lookup(self, legs):
+        """Lectura masiva (una sola consulta). Devuelve {tramo: polilínea o None} de los encontrados."""
+        if not legs:
+            return {}
+        keys = {self._key(leg): leg for leg in legs}
+        cur = self.conn.cursor()
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS req_legs (o_lat INTEGER, o_lng INTEGER, d_lat INTEGER, d_lng INTEGER)")
+        cur.execute("DELETE FROM req_legs")
+        cur.executemany("INSERT INTO req_legs VALUES (?, ?, ?, ?)", list(keys))
+        rows = cur.execute("""
+            SELECT c.o_lat, c.o_lng, c.d_lat, c.d_lng, c.points
+            FROM req_legs r
+            JOIN leg_cache c
+              ON c.o_lat = r.o_lat AND c.o_lng = r.o_lng AND c.d_lat = r.d_lat AND c.d_lng = r.d_lng
+            WHERE c.fetched_at >= ?
+        """, (time.time() - self.ttl_seconds,)).fetchall()
+        return {keys[tuple(row[:4])]: row[4] for row in rows}
+
+    def store(self, polylines):
+        """Guarda (o refresca) {tramo: polilínea codificada o None}."""
+        if not polylines:
+            return
+        now = time.time()
+        records = [(*self._key(leg), points, now) for leg, points in polylines.items()]
+        self.conn.executemany("INSERT OR REPLACE INTO leg_cache VALUES (?, ?, ?, ?, ?, ?)", records)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
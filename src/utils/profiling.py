@@ -0,0 +1,202 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from src.config import LOGS_DIR, PROFILE_MODE, ensure_dirs
+
+try:
+    import resource
+except ImportError:   # Windows: no hay getrusage
+    resource = None
+
+
+def _current_rss_mb():
+    """RSS actual en MB (Linux: /proc/self/statm); None si no está disponible."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_mb():
+    """Pico de RSS en MB; sin `resource` usa el pico de tracemalloc si está activo, o None."""
+    if resource is None:
+        return tracemalloc.get_traced_memory()[1] / 2**20 if tracemalloc.is_tracing() else None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa en KB, macOS en bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+class RunProfiler:
+    """
+    Instrumentación de una ejecución del pipeline: tiempos y memoria por etapa,
+    contadores (llamadas a la API, aciertos de caché...) y estadísticas del solver.
+    Se exporta como JSON estructurado o en formato de texto OpenMetrics. Es seguro
+    entre hilos (el servicio lo actualiza desde los hilos de ThreadingHTTPServer).
+
+    Con LOGISTICS_PROFILE=cprofile cada `run()` vuelca además un .prof en logs/
+    (abrible con snakeviz / pstats). py-spy no necesita hook: `py-spy record -- python main.py`
+    y los nombres de etapa del JSON permiten cuadrar su línea temporal.
+    """
+
+    def __init__(self, run_name="optimization"):
+        self._lock = threading.Lock()
+        self.reset(run_name)
+
+    def reset(self, run_name="optimization"):
+        with self._lock:
+            self.run_name = run_name
+            self.started_at = time.time()
+            self._t0 = time.perf_counter()
+            self.wall_s = None
+            self.stages = []
+            self.counters = {}
+            self.solver_stats = {}
+            self._profile = None
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Mide una etapa: tiempo de pared, CPU y RSS al terminar. `process_peak_rss_mb` es
+        el máximo histórico del proceso (ru_maxrss) al cerrar la etapa, no el pico de la
+        etapa: solo sube cuando la etapa supera todos los picos anteriores.
+        """
+        wall, cpu, rss_before = time.perf_counter(), time.process_time(), _current_rss_mb()
+        try:
+            yield
+        finally:
+            rss_after, peak = _current_rss_mb(), _peak_rss_mb()
+            record = {
+                "stage": name,
+                "wall_s": round(time.perf_counter() - wall, 4),
+                "cpu_s": round(time.process_time() - cpu, 4),
+                "rss_mb": round(rss_after, 1) if rss_after is not None else None,
+                "rss_delta_mb": round(rss_after - rss_before, 1) if rss_after is not None and rss_before is not None else None,
+                "process_peak_rss_mb": round(peak, 1) if peak is not None else None,
+            }
+            with self._lock:
+                self.stages.append(record)
+
+    @contextmanager
+    def timed(self, name):
+        """Acumula nº de llamadas y segundos totales de una operación repetida (p.ej. peticiones API)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.incr(f"{name}.calls")
+            self.incr(f"{name}.seconds", time.perf_counter() - start)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        with self._lock:
+            self.counters[name] = value
+
+    def record_solver(self, stats):
+        """Guarda el resumen del solver (ramas, soluciones, traza del objetivo...)."""
+        with self._lock:
+            self.solver_stats = dict(stats or {})
+
+    def _snapshot(self):
+        """Copia coherente de etapas, contadores y estadísticas del solver."""
+        with self._lock:
+            return list(self.stages), dict(self.counters), dict(self.solver_stats)
+
+    @contextmanager
+    def run(self):
+        """Envuelve la ejecución completa; activa cProfile si LOGISTICS_PROFILE=cprofile."""
+        if PROFILE_MODE == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.wall_s = round(time.perf_counter() - start, 4)
+            if self._profile is not None:
+                self._profile.disable()
+                ensure_dirs(LOGS_DIR)
+                path = LOGS_DIR / f"{self.run_name}_{int(self.started_at)}.prof"
+                self._profile.dump_stats(str(path))
+                print(f"🧪 Perfil cProfile guardado en: {path}")
+                self._profile = None
+
+    def cache_hit_rate(self, counters=None):
+        counters = counters if counters is not None else self._snapshot()[1]
+        hits = counters.get("distance_cache.hits", 0)
+        total = hits + counters.get("distance_cache.misses", 0)
+        return hits / total if total else None
+
+    def _wall_s(self):
+        """Tiempo real de run() (o desde reset si sigue en curso); las etapas pueden no cubrirlo todo."""
+        return self.wall_s if self.wall_s is not None else round(time.perf_counter() - self._t0, 4)
+
+    def to_dict(self):
+        stages, counters, solver_stats = self._snapshot()
+        peak = _peak_rss_mb()
+        return {
+            "run": self.run_name,
+            "started_at": self.started_at,
+            "wall_s": self._wall_s(),
+            "stages_wall_s": round(sum(s["wall_s"] for s in stages), 4),
+            "process_peak_rss_mb": round(peak, 1) if peak is not None else None,
+            "stages": stages,
+            "counters": counters,
+            "distance_cache_hit_rate": self.cache_hit_rate(counters),
+            "solver": solver_stats,
+        }
+
+    def write_json(self, path):
+        ensure_dirs(Path(path).parent)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False, default=str)
+        return path
+
+    def to_openmetrics(self):
+        """Exposición en texto OpenMetrics (compatible con node_exporter textfile / Prometheus)."""
+        run = self.run_name
+        stages, counters, solver_stats = self._snapshot()
+        # Una serie por nombre de etapa: las repeticiones suman tiempo y el pico es el máximo
+        seconds, peaks = {}, {}
+        for s in stages:
+            seconds[s["stage"]] = round(seconds.get(s["stage"], 0) + s["wall_s"], 4)
+            if s["process_peak_rss_mb"] is not None:
+                peaks[s["stage"]] = max(peaks.get(s["stage"], 0), s["process_peak_rss_mb"])
+        lines = [
+            "# TYPE logistics_run_seconds gauge",
+            f'logistics_run_seconds{{run="{run}"}} {self._wall_s()}',
+            "# TYPE logistics_stage_seconds gauge",
+            *[f'logistics_stage_seconds{{run="{run}",stage="{name}"}} {v}' for name, v in seconds.items()],
+            "# TYPE logistics_stage_process_peak_rss_megabytes gauge",
+            *[f'logistics_stage_process_peak_rss_megabytes{{run="{run}",stage="{name}"}} {v}' for name, v in peaks.items()],
+            "# TYPE logistics_counter gauge",
+            *[f'logistics_counter{{run="{run}",name="{k}"}} {v}' for k, v in sorted(counters.items())
+              if isinstance(v, (int, float))],
+        ]
+        for key in ("objective", "solutions", "branches", "failures", "wall_time_s"):
+            value = solver_stats.get(key)
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE logistics_solver_{key} gauge")
+                lines.append(f'logistics_solver_{key}{{run="{run}"}} {value}')
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_openmetrics(self, path):
+        ensure_dirs(Path(path).parent)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_openmetrics())
+        return path
+
+
+# Instancia compartida por el pipeline (GeoUtils, solver, visualizador...)
+metrics = RunProfiler()
@@ -0,0 +1,187 @@
+import json
+from pathlib import Path
+import numpy as np
+import polars as pl
+from src.config import ensure_dirs
+from src.engine.node_table import NodeTable, TYPE_NAMES
+
+EXPORT_VERSION = 1
+
+
+def nodes_path(path):
+    """Fichero de la tabla de nodos que acompaña a un export Parquet/Arrow."""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.nodes{path.suffix}")
+
+
+class RouteWriter:
+    """
+    Export compacto de una solución: una única tabla de nodos (columnas id, name, type,
+    parent, lat, lng) y cada ruta como secuencia de índices int32 en esa tabla, con la
+    distancia de cada tramo si se pasa la matriz.
+
+    - `.ndjson`: una cabecera con la tabla de nodos en columnas y una línea por ruta,
+      escrita en cuanto se extrae (streaming, memoria constante por ruta).
+    - `.parquet` / `.arrow`: rutas en `path` (listas int32) y nodos en `<stem>.nodes<ext>`;
+      las rutas se acumulan como arrays y se escriben al cerrar.
+
+    Se escribe sobre `<path>.part` (y `<stem>.nodes<ext>.part`) y solo se sustituyen los
+    ficheros finales al cerrar sin errores, con al menos una ruta y, en Parquet/Arrow,
+    tras escribir ambos: una búsqueda fallida no pisa la solución anterior.
+
+    Uso: `with RouteWriter(path, solver.nodes, solver.distance_matrix) as w: w.write_route(r)`.
+    """
+
+    def __init__(self, path, nodes, distance_matrix=None):
+        self.path = Path(path)
+        self.format = self.path.suffix.lstrip(".")
+        if self.format not in ("ndjson", "parquet", "arrow"):
+            raise ValueError(f"Formato de export no soportado: {self.path.suffix}")
+        self.nodes = nodes
+        self.matrix = distance_matrix
+        self.count = 0
+        self._part = self.path.with_name(self.path.name + ".part")
+        self._file = None
+        self._routes, self._legs = [], []
+
+    def __enter__(self):
+        ensure_dirs(self.path.parent)
+        if self.format == "ndjson":
+            self._file = open(self._part, 'w', encoding='utf-8')
+            header = {"kind": "nodes", "version": EXPORT_VERSION, "types": TYPE_NAMES, **self._node_columns()}
+            self._file.write(json.dumps(header, ensure_ascii=False) + "\n")
+        return self
+
+    def _node_columns(self):
+        return {
+            "id": list(self.nodes.ids),
+            "name": list(self.nodes.names),
+            "type": self.nodes.type_code.tolist(),
+            "parent": self.nodes.parent.tolist(),
+            "lat": self.nodes.lat.tolist(),
+            "lng": self.nodes.lng.tolist(),
+        }
+
+    def write_route(self, route):
+        """Añade una ruta (índices de nodo, depósito incluido)."""
+        route = np.asarray(route, dtype=np.int32)
+        legs = None if self.matrix is None else np.asarray(self.matrix[route[:-1], route[1:]], dtype=np.float64)
+        if self.format == "ndjson":
+            line = {"kind": "route", "route": self.count, "stops": route.tolist()}
+            if legs is not None:
+                line["legs_m"] = legs.round(1).tolist()
+            self._file.write(json.dumps(line) + "\n")
+        else:
+            self._routes.append(route)
+            self._legs.append(legs)
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.format == "ndjson":
+            self._file.close()
+            if exc_type is None and self.count:
+                self._part.replace(self.path)
+            else:
+                self._part.unlink(missing_ok=True)
+            return False
+        if exc_type is not None or not self.count:
+            return False
+        columns = {
+            "route": pl.Series(range(len(self._routes)), dtype=pl.Int32),
+            "stops": pl.Series([r.tolist() for r in self._routes], dtype=pl.List(pl.Int32)),
+        }
+        if self.matrix is not None:
+            columns["legs_m"] = pl.Series([l.tolist() for l in self._legs], dtype=pl.List(pl.Float64))
+        routes = pl.DataFrame(columns)
+        nodes = pl.DataFrame(self._node_columns()).with_columns(
+            pl.col("type").cast(pl.Int8), pl.col("parent").cast(pl.Int32))
+        nodes_file = nodes_path(self.path)
+        nodes_part = nodes_file.with_name(nodes_file.name + ".part")
+        try:
+            if self.format == "parquet":
+                routes.write_parquet(self._part)
+                nodes.write_parquet(nodes_part)
+            else:
+                routes.write_ipc(self._part)
+                nodes.write_ipc(nodes_part)
+        except BaseException:
+            self._part.unlink(missing_ok=True)
+            nodes_part.unlink(missing_ok=True)
+            raise
+        # Nodos primero: un lector que vea las rutas nuevas ya encuentra su tabla
+        nodes_part.replace(nodes_file)
+        self._part.replace(self.path)
+        return False
+
+
+def write_routes(path, nodes, routes, distance_matrix=None):
+    """Atajo: exporta una lista de rutas de índices de una vez."""
+    with RouteWriter(path, nodes, distance_matrix) as writer:
+        for route in routes:
+            writer.write_route(route)
+    return Path(path)
+
+
+def _table_from_columns(cols):
+    return NodeTable(
+        type_code=np.asarray(cols["type"], dtype=np.int8),
+        parent=np.asarray(cols["parent"], dtype=np.int32),
+        lat=np.asarray(cols["lat"], dtype=np.float64),
+        lng=np.asarray(cols["lng"], dtype=np.float64),
+        ids=list(cols["id"]),
+        names=list(cols["name"]),
+        records=None,
+    )
+
+
+def read_routes(path):
+    """
+    Lee un export compacto. Devuelve (NodeTable, rutas como arrays int32, distancias por
+    tramo en metros o None). Las vistas dict de la tabla se crean solo al indexarla.
+    """
+    path = Path(path)
+    if path.suffix == ".ndjson":
+        routes, legs = [], []
+        with open(path, 'r', encoding='utf-8') as f:
+            table = _table_from_columns(json.loads(f.readline()))
+            for line in f:
+                record = json.loads(line)
+                routes.append(np.asarray(record["stops"], dtype=np.int32))
+                legs.append(np.asarray(record["legs_m"]) if "legs_m" in record else None)
+    else:
+        reader = pl.read_parquet if path.suffix == ".parquet" else pl.read_ipc
+        table = _table_from_columns(reader(nodes_path(path)).to_dict(as_series=False))
+        frame = reader(path).sort("route")
+        routes = [np.asarray(stops, dtype=np.int32) for stops in frame["stops"].to_list()]
+        legs = ([np.asarray(l) for l in frame["legs_m"].to_list()] if "legs_m" in frame.columns
+                else [None] * len(routes))
+    return table, routes, (legs if all(l is not None for l in legs) else None)
+
+
+def load_route_dicts(path):
+    """
+    Rutas como listas de dicts de nodo (formato que esperan Visualizer y los grafos)
+    y sus RouteKPIs, calculados a partir de las distancias por tramo guardadas (sin
+    matriz NxN, así que sin desvío por cliente). Acepta también el JSON antiguo (lista
+    de rutas con los nodos completos) y exports sin distancias: en esos casos los
+    tramos se aproximan con haversine.
+    """
+    from src.engine.route_kpis import RouteKPIs
+    from src.utils.geo import haversine_kernel
+    path = Path(path)
+    if path.suffix == ".json":
+        with open(path, 'r', encoding='utf-8') as f:
+            routes = json.load(f)
+        lat = np.array([node['lat'] for route in routes for node in route[:-1]])
+        lng = np.array([node['lng'] for route in routes for node in route[:-1]])
+        lat2 = np.array([node['lat'] for route in routes for node in route[1:]])
+        lng2 = np.array([node['lng'] for route in routes for node in route[1:]])
+        return routes, RouteKPIs.from_dict_routes(routes, leg_m=haversine_kernel(lat, lng, lat2, lng2))
+    table, routes, legs = read_routes(path)
+    if legs is None:
+        origin = np.concatenate([route[:-1] for route in routes]) if routes else np.zeros(0, dtype=np.int32)
+        dest = np.concatenate([route[1:] for route in routes]) if routes else np.zeros(0, dtype=np.int32)
+        leg_m = haversine_kernel(table.lat[origin], table.lng[origin], table.lat[dest], table.lng[dest])
+    else:
+        leg_m = np.concatenate(legs) if legs else np.zeros(0)
+    return table.to_routes(routes), RouteKPIs(routes, table.type_code, leg_m=leg_m)
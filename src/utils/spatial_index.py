@@ -0,0 +1,42 @@
+import numpy as np
+from src.utils.geo import EARTH_RADIUS_M
+
+EARTH_RADIUS_KM = EARTH_RADIUS_M / 1000
+
+
+def to_unit_vectors(lats, lngs):
+    """Convierte coordenadas en grados a vectores 3D sobre la esfera unidad."""
+    lat, lng = np.radians(lats), np.radians(lngs)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)))
+
+
+class ClientSpatialIndex:
+    """
+    KD-tree sobre los vectores unitarios 3D de los clientes.
+    En R^3 la distancia euclídea (cuerda) es una métrica válida y nunca supera
+    al arco, así que el pasillo de retorno se puede acotar por una bola.
+    """
+
+    def __init__(self, lats, lngs):
+        self.points = to_unit_vectors(np.asarray(lats, dtype=np.float64), np.asarray(lngs, dtype=np.float64))
+        from scipy.spatial import cKDTree   # Carga diferida: scipy.spatial pesa ~0.3 s al importar
+        self.tree = cKDTree(self.points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def query_corridor(self, origin, destination, arc_km, threshold_km):
+        """
+        Candidatos con desvío (d(P,C) + d(C,M)) - d(P,M) < threshold_km.
+
+        Si el desvío cumple el umbral, cuerda(P,C) + cuerda(C,M) <= d(P,C) + d(C,M)
+        < arc_km + threshold_km, y por desigualdad triangular en R^3 el cliente
+        está a menos de (arc_km + threshold_km) / 2 del punto medio de P y M.
+        La bola es un superconjunto exacto: el filtro fino lo hace el llamador.
+        """
+        p = to_unit_vectors(origin[0], origin[1])[0]
+        m = to_unit_vectors(destination[0], destination[1])[0]
+        radius = (arc_km + threshold_km) / (2 * EARTH_RADIUS_KM)
+        idx = self.tree.query_ball_point((p + m) / 2, radius)
+        return np.sort(np.asarray(idx, dtype=np.intp))
@@ -1,18 +1,34 @@
 import folium
 from folium import plugins
 import plotly.graph_objects as go
-import pandas as pd
-import polyline
-import networkx as nx
-from src.config import MAPS_DIR, RESULTS_DIR
+from src.config import ensure_dirs, MAPS_DIR, RESULTS_DIR, MAP_MODE, MAP_CLUSTER_MIN_STOPS, MAP_SIDEBAR_MAX_LEGS
 from src.utils.geo import GeoUtils
+from src.utils.graph_layout import build_route_graph, compute_layout, short_label
 import os
 import json
 
+# Marcador ligero para FastMarkerCluster: cada fila es [lat, lng, nombre, color]
+CUSTOMER_CLUSTER_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+        {radius: 5, color: row[3], weight: 1, fillColor: row[3], fillOpacity: 0.8});
+    marker.bindPopup('🏪 <b>CLIENTE:</b> ' + row[2]);
+    return marker;
+}
+"""
+
 class Visualizer:
-    def __init__(self, routes, distance_matrix):
+    def __init__(self, routes, distance_matrix, kpis=None):
+        """
+        `kpis` (RouteKPIs de estas rutas, p.ej. `solver.kpis`) evita recalcularlos; si no
+        se pasan se obtienen una vez de `distance_matrix` con una sola indexación vectorizada.
+        """
         self.routes = routes
         self.distance_matrix = distance_matrix
+        if kpis is None:
+            from src.engine.route_kpis import RouteKPIs
+            kpis = RouteKPIs.from_dict_routes(routes, distance_matrix)
+        self.kpis = kpis
         self.geo = GeoUtils()
         # Colores optimizados (Alta visibilidad)
         self.route_colors = [
@@ -20,21 +36,32 @@ class Visualizer:
             '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf'
         ]
 
-    def _generate_sidebar_html(self):
-        """Genera el código HTML para la tabla lateral interactiva de rutas."""
+    @classmethod
+    def from_export(cls, path):
+        """Visualizer desde un export de rutas (.ndjson/.parquet/.arrow o JSON antiguo) sin re-resolver."""
+        from src.utils.route_export import load_route_dicts
+        routes, kpis = load_route_dicts(path)
+        return cls(routes, None, kpis=kpis)
+
+    def _generate_sidebar_html(self, max_detail_legs=None):
+        """
+        Genera el código HTML para la tabla lateral interactiva de rutas.
+        `max_detail_legs` limita el desglose por ruta (los km se suman siempre completos).
+        """
         table_rows = ""
-        total_km = 0
+        total_km = self.kpis.total_m / 1000
         
         for i, route in enumerate(self.routes):
             color = self.route_colors[i % len(self.route_colors)]
-            route_dist = 0
+            route_dist = self.kpis.route_m[i] / 1000
+            leg_km = (self.kpis.legs(i) / 1000).tolist()
             detail_html = "<ul style='padding-left: 15px; font-size: 11px; margin: 5px 0; color: #444; list-style-type: none;'>"
             
             for j in range(len(route) - 1):
+                if max_detail_legs is not None and j >= max_detail_legs:
+                    break
                 start, end = route[j], route[j+1]
-                dist_m = self.distance_matrix[start['matrix_idx']][end['matrix_idx']]
-                dist_km = dist_m / 1000
-                route_dist += dist_km
+                dist_km = leg_km[j]
                 
                 # Definir iconos según tipo
                 s_icon = "🏢" if start['type'] == 'depot' else "🏭" if start['type'] == 'carton_plant' else "🏪"
@@ -42,8 +69,9 @@ class Visualizer:
                 
                 detail_html += f"<li>{s_icon} {start['name']} <span style='color:{color}'>→</span> {e_icon} {end['name']} <b style='float:right'>{dist_km:.1f} km</b></li>"
             
+            if max_detail_legs is not None and len(route) - 1 > max_detail_legs:
+                detail_html += f"<li><i>… y {len(route) - 1 - max_detail_legs} tramos más</i></li>"
             detail_html += "</ul>"
-            total_km += route_dist
             
             table_rows += f"""
             <tr onclick="toggleRoute({i})" style="cursor: pointer; border-bottom: 1px solid #ddd; background-color: {color}11;">
@@ -58,6 +86,12 @@ class Visualizer:
             </tr>
             """
 
+        summary = self.kpis.summary()
+        detour_html = ""
+        if summary['detour_km'] is not None:
+            detour_html = (f"<p style=\"margin: 5px 0;\"><strong>🛣️ Desvío por clientes:</strong> {summary['detour_km']:.1f} km "
+                           f"({summary['customers_served']} clientes)</p>")
+
         html = f"""
         <div id="sidebar" style="
             position: fixed; top: 10px; right: 10px; width: 380px; height: 95%;
@@ -73,6 +107,9 @@ class Visualizer:
             <div id="stats-summary" style="margin: 20px 0; background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%); padding: 15px; border-radius: 10px; border-left: 5px solid #3498db;">
                 <p style="margin: 5px 0;"><strong>🗺️ Rutas Activas:</strong> {len(self.routes)}</p>
                 <p style="margin: 5px 0;"><strong>🏁 Kilómetros Totales:</strong> <span style="font-size: 1.2em; color: #2c3e50;">{total_km:.2f}</span> km</p>
+                <p style="margin: 5px 0;"><strong>🔙 Retorno en vacío:</strong> {summary['empty_return_km']:.1f} km ({summary['empty_return_share']:.0%})</p>
+                <p style="margin: 5px 0;"><strong>🚚 Uso del límite por ruta:</strong> {summary['mean_utilisation']:.0%} medio, {summary['max_utilisation']:.0%} máx.</p>
+                {detour_html}
                 <p style="margin: 5px 0; font-size: 0.9em; color: #666;">📍 Base: Mengíbar (Papel)</p>
             </div>
 
@@ -107,72 +144,127 @@ class Visualizer:
         """
         return html
 
-    def create_map(self, filename="Logistics_Dashboard.html"):
+    def create_map(self, filename="Logistics_Dashboard.html", mode=MAP_MODE):
+        """
+        Genera el dashboard Folium. `mode="detailed"` dibuja un marcador y una polilínea
+        por nodo/tramo; `mode="clustered"` emite una FeatureCollection GeoJSON por ruta,
+        agrupa los clientes en FastMarkerCluster y añade un control de capas por ruta,
+        de modo que el HTML se mantiene pequeño con miles de paradas.
+        """
+        n_stops = sum(len(route) for route in self.routes)
+        if mode == "auto":
+            mode = "clustered" if n_stops >= MAP_CLUSTER_MIN_STOPS else "detailed"
+
         m = folium.Map(location=[40.4167, -3.7037], zoom_start=6, tiles="cartodbpositron")
-        sidebar_html = self._generate_sidebar_html()
+        max_detail_legs = MAP_SIDEBAR_MAX_LEGS if mode == "clustered" else None
+        sidebar_html = self._generate_sidebar_html(max_detail_legs)
         m.get_root().html.add_child(folium.Element(sidebar_html))
 
+        # Todos los tramos de una vez: caché persistente + descarga concurrente de los que faltan
+        legs = [((start['lat'], start['lng']), (end['lat'], end['lng']))
+                for route in self.routes for start, end in zip(route, route[1:])]
+        geometries = self.geo.get_route_polylines(legs)
+
+        if mode == "clustered":
+            self._add_clustered_layers(m, geometries)
+        else:
+            self._add_detailed_layers(m, geometries)
+
+        output_path = MAPS_DIR / filename
+        ensure_dirs(output_path.parent)
+        m.save(output_path)
+        return output_path
+
+    def _node_marker(self, node):
+        """Marcador Folium con el icono y el popup de cada tipo de nodo."""
+        icon_type = "info-sign"
+        icon_color = "blue"
+        popup_text = f"<b>{node['name']}</b>"
+        
+        if node['type'] == 'depot':
+            icon_type = "home"; icon_color = "red"
+            popup_text = f"🏛️ <b>DEPÓSITO PAPEL:</b> {node['name']}"
+        elif node['type'] == 'carton_plant':
+            icon_type = "industry"; icon_color = "green"
+            popup_text = f"🏭 <b>PLANTA CARTÓN:</b> {node['name']}"
+        elif node['type'] == 'customer':
+            icon_type = "shopping-cart"; icon_color = "orange"
+            popup_text = f"🏪 <b>CLIENTE:</b> {node['name']}"
+
+        return folium.Marker(
+            location=[node['lat'], node['lng']],
+            popup=popup_text,
+            icon=folium.Icon(color=icon_color, icon=icon_type, prefix='fa' if node['type'] == 'carton_plant' else 'glyphicon')
+        )
+
+    def _add_detailed_layers(self, m, geometries):
+        """Un objeto Folium por tramo y por nodo (instancias pequeñas)."""
         for i, route in enumerate(self.routes):
             color = self.route_colors[i % len(self.route_colors)]
             
             for j in range(len(route) - 1):
                 start, end = route[j], route[j+1]
-                encoded_poly = self.geo.get_route_polyline((start['lat'], start['lng']), (end['lat'], end['lng']))
+                points = geometries[((start['lat'], start['lng']), (end['lat'], end['lng']))]
                 
-                if encoded_poly and encoded_poly != "BILLING_ERROR":
-                    decoded_points = polyline.decode(encoded_poly)
-                    folium.PolyLine(decoded_points, color=color, weight=4, opacity=0.8, 
+                if points:
+                    folium.PolyLine(points, color=color, weight=4, opacity=0.8, 
                                    tooltip=f"{start['name']} → {end['name']}").add_to(m)
                 else:
                     folium.PolyLine([[start['lat'], start['lng']], [end['lat'], end['lng']]], 
                                    color=color, weight=4, opacity=0.8, dash_array='5, 10',
                                    tooltip=f"{start['name']} → {end['name']} (Directo)").add_to(m)
 
-            for step, node in enumerate(route):
-                icon_type = "info-sign"
-                icon_color = "blue"
-                popup_text = f"<b>{node['name']}</b>"
-                
-                if node['type'] == 'depot':
-                    icon_type = "home"; icon_color = "red"
-                    popup_text = f"🏛️ <b>DEPÓSITO PAPEL:</b> {node['name']}"
-                elif node['type'] == 'carton_plant':
-                    icon_type = "industry"; icon_color = "green"
-                    popup_text = f"🏭 <b>PLANTA CARTÓN:</b> {node['name']}"
-                elif node['type'] == 'customer':
-                    icon_type = "shopping-cart"; icon_color = "orange"
-                    popup_text = f"🏪 <b>CLIENTE:</b> {node['name']}"
+            for node in route:
+                self._node_marker(node).add_to(m)
 
-                folium.Marker(
-                    location=[node['lat'], node['lng']],
-                    popup=popup_text,
-                    icon=folium.Icon(color=icon_color, icon=icon_type, prefix='fa' if node['type'] == 'carton_plant' else 'glyphicon')
-                ).add_to(m)
+    def _add_clustered_layers(self, m, geometries):
+        """Una capa conmutable por ruta: GeoJSON con sus tramos + clúster de clientes."""
+        depots = {}
+        for i, route in enumerate(self.routes):
+            color = self.route_colors[i % len(self.route_colors)]
+            group = folium.FeatureGroup(name=f"#{i+1} {route[1]['name']}").add_to(m)
 
-        output_path = MAPS_DIR / filename
-        m.save(output_path)
-        return output_path
+            # Tramos por carretera y directos (sin geometría) en dos MultiLineString
+            road, direct = [], []
+            for start, end in zip(route, route[1:]):
+                points = geometries[((start['lat'], start['lng']), (end['lat'], end['lng']))]
+                if points:
+                    road.append([[lng, lat] for lat, lng in points])
+                else:
+                    direct.append([[start['lng'], start['lat']], [end['lng'], end['lat']]])
+            features = [
+                {"type": "Feature", "geometry": {"type": "MultiLineString", "coordinates": lines},
+                 "properties": {"route": i + 1, "kind": kind}}
+                for kind, lines in (("road", road), ("direct", direct)) if lines
+            ]
+            folium.GeoJson(
+                {"type": "FeatureCollection", "features": features},
+                style_function=lambda feature, color=color: {
+                    "color": color, "weight": 4, "opacity": 0.8,
+                    "dashArray": "5, 10" if feature["properties"]["kind"] == "direct" else None,
+                },
+                tooltip=f"Ruta #{i+1}: {route[1]['name']}",
+            ).add_to(group)
 
-    def create_plotly_graph(self, filename="Logistics_Graph.html"):
-        """Crea una vista de grafo avanzada usando NetworkX para el layout y Plotly para la visualización."""
-        G = nx.DiGraph()
-        
-        # Recopilar todos los nodos y sus atributos
-        unique_nodes = {}
-        for route in self.routes:
+            # Depósito una sola vez; plantas con su ruta; clientes agrupados
             for node in route:
-                unique_nodes[node['id']] = node
-                G.add_node(node['id'], name=node['name'], type=node['type'])
+                if node['type'] == 'depot':
+                    depots[node['id']] = node
+                elif node['type'] == 'carton_plant':
+                    self._node_marker(node).add_to(group)
+            customers = [[n['lat'], n['lng'], n['name'], color] for n in route if n['type'] == 'customer']
+            if customers:
+                plugins.FastMarkerCluster(customers, callback=CUSTOMER_CLUSTER_CALLBACK).add_to(group)
 
-        # Añadir aristas con peso (distancia)
-        for route in self.routes:
-            for j in range(len(route) - 1):
-                start, end = route[j], route[j+1]
-                dist_km = self.distance_matrix[start['matrix_idx']][end['matrix_idx']] / 1000
-                G.add_edge(start['id'], end['id'], weight=dist_km)
+        for node in depots.values():
+            self._node_marker(node).add_to(m)
+        folium.LayerControl(position="topleft", collapsed=False).add_to(m)
 
-        # Generar layout con NetworkX (spring_layout agrupado, k pequeño para emular vista compacta)
-        pos = nx.spring_layout(G, k=0.15, iterations=150, seed=42)
+    def create_plotly_graph(self, filename="Logistics_Graph.html"):
+        """Crea una vista de grafo avanzada usando el layout compartido (graph_layout) y Plotly para la visualización."""
+        G, unique_nodes = build_route_graph(self.routes, self.kpis)
+        # Layout O(N) calculado una vez por conjunto de rutas (compartido con el PNG estático)
+        pos = compute_layout(self.routes, graph=G, unique_nodes=unique_nodes)
         
         edge_x = []
         edge_y = []
@@ -211,10 +303,7 @@ class Visualizer:
                     t_y.append(y)
                     
                     # Dividir nombres largos en dos lineas cortas para que quepan en la bola
-                    words = n_data['name'].replace('Smurfit Westrock ', '').split()
-                    short_name = "<br>".join(words[:2]) if len(words) > 1 else words[0] if words else ""
-                    
-                    t_text.append(short_name)
+                    t_text.append(short_label(n_data['name'], "<br>"))
                     t_hover.append(f"<b>{n_data['name']}</b><br>Tipo: {n_data['type']}")
                     
             if len(t_x) > 0:
@@ -253,5 +342,6 @@ class Visualizer:
         )
 
         output_path = RESULTS_DIR / filename
+        ensure_dirs(output_path.parent)
         fig.write_html(str(output_path))
         return output_path